@@ -1,6 +1,7 @@
 """
 Основная логика телеграм-бота "Личный Таролог ✨🔮✨"
 """
+import importlib.util
 import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
@@ -8,6 +9,9 @@ from src.config import load_config
 from src.keyboards import main_menu
 from src.handlers import handle_callback, handle_text_message
 from src.user_manager import init_storage
+from src.image_generator import warm_cache
+from src.llm_integration import warm_up_integration
+from src.openrouter_client import close_http_session
 
 
 # Настройка логирования
@@ -18,6 +22,22 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def get_bot_http_version() -> str:
+    """
+    Выбирает версию HTTP для запросов к Bot API
+    
+    HTTP/2 мультиплексирует все отправки бота (несколько частей финального
+    сообщения, удаление промежуточных сообщений, правки прогресс-бара) в одном
+    постоянном соединении. Требует пакет h2 (pip install "httpx[http2]");
+    без него используется HTTP/1.1 с пулом keep-alive соединений.
+    
+    :return: "2" если HTTP/2 доступен, иначе "1.1"
+    """
+    if importlib.util.find_spec("h2") is not None:
+        return "2"
+    return "1.1"
+
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обработчик команды /start
@@ -102,6 +122,11 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error(f"Исключение при обработке обновления {update}:", exc_info=context.error)
 
 
+async def post_shutdown(application: Application) -> None:
+    """Освобождает общие ресурсы после остановки бота"""
+    await close_http_session()
+
+
 def run_bot(config=None):
     """
     Главная функция запуска телеграм-бота
@@ -132,14 +157,39 @@ def run_bot(config=None):
         else:
             print("✅ Хранилище пользователей готово")
         
+        # Заранее готовим изображения карт, чтобы первые расклады не ждали диск и масштабирование
+        print("🖼 Прогреваем кэш изображений карт...")
+        try:
+            warm_cache()
+        except Exception as e:
+            logger.error(f"Не удалось прогреть кэш изображений: {e}")
+            print(f"⚠️ Кэш изображений не прогрет, карты будут загружаться по требованию: {e}")
+        
+        # Колода, промпты и данные карт для LLM тоже загружаются до приёма первых сообщений
+        try:
+            warm_up_integration()
+        except Exception as e:
+            logger.error(f"Не удалось заранее загрузить промпты и данные карт: {e}")
+            print(f"⚠️ Промпты и данные карт будут загружены при первом раскладе: {e}")
+        
         # Инициализируем приложение с дополнительными параметрами для устранения конфликтов
         print("🤖 Инициализируем бота...")
+        http_version = get_bot_http_version()
+        logger.info(f"Запросы к Bot API отправляются по HTTP/{http_version}")
         application = (Application.builder()
             .token(config['telegram_bot_token'])
+            .http_version(http_version)
+            # Один пул соединений на все запросы бота: keep-alive соединения переиспользуются,
+            # а размер пула ограничивает число одновременных запросов
+            .connection_pool_size(256)
             .connect_timeout(30)
+            .read_timeout(30)
+            .write_timeout(30)
             .pool_timeout(30)
             .get_updates_connect_timeout(30)
             .get_updates_pool_timeout(30)
+            # Общая сессия OpenRouter закрывается при остановке
+            .post_shutdown(post_shutdown)
             .build())
         
         # Регистрируем обработчики команд
@@ -7,6 +7,12 @@ import os
 from typing import List, Dict, Optional
 
 
+# Папка с изображениями карт по умолчанию (относительно корня проекта)
+DEFAULT_IMAGES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'cards'
+)
+
+
 class TarotDeck:
     """Класс для работы с колодой карт Таро"""
     
@@ -23,6 +29,8 @@ class TarotDeck:
         
         self.cards_file_path = cards_file_path
         self._cards = []
+        # Уже проверенные пути к изображениям карт: (папка, файл) -> путь
+        self._image_paths = {}
         self._load_cards()
     
     def _load_cards(self):
@@ -91,18 +99,23 @@ class TarotDeck:
         :return: Полный путь к файлу изображения
         """
         if images_dir is None:
-            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            images_dir = os.path.join(project_root, 'assets', 'cards')
+            images_dir = DEFAULT_IMAGES_DIR
         
         image_filename = card.get('img')
         if not image_filename:
             raise ValueError(f"У карты '{card.get('name', 'unknown')}' отсутствует поле 'img'")
         
-        image_path = os.path.join(images_dir, image_filename)
-        
-        # Проверяем существование файла изображения
-        if not os.path.exists(image_path):
-            print(f"⚠️  Предупреждение: изображение не найдено: {image_path}")
+        # Путь собираем и проверяем на диске один раз для каждой карты
+        key = (images_dir, image_filename)
+        image_path = self._image_paths.get(key)
+        if image_path is None:
+            image_path = os.path.join(images_dir, image_filename)
+            
+            # Проверяем существование файла изображения
+            if not os.path.exists(image_path):
+                print(f"⚠️  Предупреждение: изображение не найдено: {image_path}")
+            
+            self._image_paths[key] = image_path
         
         return image_path
     
@@ -152,12 +165,13 @@ def select_cards(deck: TarotDeck, count: int, magic_number: int, user_age: int =
         complex_seed = magic_number
         print(f"🎴 Выбрано {count} карт с магическим числом {magic_number}")
     
-    # Устанавливаем seed для воспроизводимости
-    random.seed(complex_seed)
+    # Отдельный генератор с тем же seed: выборка та же, что и при random.seed(),
+    # но глобальное состояние random не сбрасывается для остального бота
+    rng = random.Random(complex_seed)
     
-    # Получаем все карты и выбираем случайные без повторений
-    all_cards = deck.cards
-    selected_cards = random.sample(all_cards, count)
+    # Выбираем случайные карты без повторений (sample возвращает новый список,
+    # поэтому копия колоды через deck.cards не нужна)
+    selected_cards = rng.sample(deck._cards, count)
     
     return selected_cards
 
@@ -5,23 +5,39 @@ import json
 import os
 
 
+# Последняя успешно загруженная конфигурация: (абсолютный путь, mtime_ns, размер) -> словарь
+_config_cache_key = None
+_config_cache = None
+
+
 def load_config():
     """
     Загружает конфигурацию из файла config.json
     
+    Результат кэшируется: пока файл не изменён (путь, время изменения и размер
+    совпадают), повторные вызовы не читают и не разбирают его заново.
+    Возвращаемый словарь общий для всех вызовов - не изменяйте его.
+    
     :return: Словарь с настройками проекта
     :raises FileNotFoundError: Если файл config.json не найден
     :raises ValueError: Если файл содержит некорректный JSON
     """
+    global _config_cache_key, _config_cache
     config_path = "config.json"
     
     # Проверяем существование файла
-    if not os.path.exists(config_path):
+    try:
+        stat = os.stat(config_path)
+    except FileNotFoundError:
         raise FileNotFoundError(
             f"Файл конфигурации не найден: {config_path}\n"
             f"Создайте файл config.json в корне проекта"
         )
     
+    cache_key = (os.path.abspath(config_path), stat.st_mtime_ns, stat.st_size)
+    if cache_key == _config_cache_key:
+        return _config_cache
+    
     try:
         with open(config_path, 'r', encoding='utf-8') as file:
             config = json.load(file)
@@ -40,6 +56,8 @@ def load_config():
             raise ValueError("Ошибка: Добавьте токен бота в config.json")
         
         print(f"✅ Конфигурация успешно загружена из {config_path}")
+        _config_cache_key = cache_key
+        _config_cache = config
         return config
         
     except json.JSONDecodeError as e:
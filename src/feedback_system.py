@@ -119,7 +119,7 @@ class FeedbackSystem:
             if log_filepath:
                 # Сохраняем рейтинг в лог
                 spread_logger = get_spread_logger()
-                spread_logger.add_feedback(log_filepath, rating)
+                spread_logger.submit(spread_logger.add_feedback, log_filepath, rating)
             
             # Благодарим пользователя, НО ОСТАВЛЯЕМ КОММЕНТАРИЙ
             thank_you_message = self.THANK_YOU_MESSAGES.get(rating, "Спасибо за отзыв!")
@@ -219,7 +219,7 @@ class FeedbackSystem:
             if log_filepath:
                 # Сохраняем комментарий в лог (рейтинг 0 = только комментарий)
                 spread_logger = get_spread_logger()
-                spread_logger.add_feedback(log_filepath, 0, comment)
+                spread_logger.submit(spread_logger.add_feedback, log_filepath, 0, comment)
             
             # Благодарим за комментарий, НО ОСТАВЛЯЕМ ОЦЕНКУ
             response_message = (
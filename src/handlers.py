@@ -1,6 +1,7 @@
 """
 Обработчики callback-запросов для inline-кнопок и пошаговый сбор данных
 """
+import asyncio
 import logging
 import io
 import time
@@ -8,15 +9,15 @@ import random
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from src.keyboards import main_menu, spreads_menu, back_button, SPREAD_NAMES, tariff_selection_menu, credits_info_menu, spread_guide_navigation
-from src.simple_state import UserState, get_state, set_state, update_data, get_user_data, reset_to_idle, add_message_to_delete
+from src.simple_state import UserState, get_state, set_state, update_data, update_data_many, get_user_data, reset_to_idle, add_message_to_delete
 from src.validators import validate_name, validate_birthdate, validate_magic_number
-from src.user_manager import user_exists, save_user, get_user, update_last_spread, get_user_credits, use_credit, has_credits
+from src.user_manager import save_user, update_last_spread, get_user_credits, use_credit, fetch_user_and_debit
 from src.config import load_config
 from src.spread_configs import get_spread_config
 from src.card_manager import TarotDeck, select_cards
 from src.image_generator import ImageGenerator
 from src.spread_questions import get_questions_for_spread, get_spread_type_from_callback
-from src.llm_integration import start_llm_interpretation, process_llm_questions
+from src.llm_integration import start_llm_interpretation, process_llm_questions, SPREAD_MAPPING
 
 from src.feedback_system import get_feedback_system
 from PIL import Image
@@ -136,27 +137,11 @@ async def start_preliminary_questions(update: Update, context: ContextTypes.DEFA
 
 logger = logging.getLogger(__name__)
 
-# ВСЕ 7 раскладов теперь готовы! (соответствуют callback_data из keyboards.py)
-IMPLEMENTED_SPREADS = {
-    'spread_single',     # На одну карту
-    'spread_three',      # На три карты  
-    'spread_horseshoe',  # Подкова
-    'spread_love',       # Любовный треугольник
-    'spread_celtic',     # Кельтский крест
-    'spread_week',       # Прогноз на неделю
-    'spread_year'        # Колесо года
-}
+# ВСЕ 7 раскладов теперь готовы! (соответствуют callback_data из keyboards.py).
+# Набор выводится из SPREAD_MAPPING, чтобы два списка раскладов не расходились
+IMPLEMENTED_SPREADS = frozenset(SPREAD_MAPPING)
 
-# Mapping между callback_data и конфигурациями
-SPREAD_MAPPING = {
-    'spread_single': 'single_card',
-    'spread_three': 'three_cards', 
-    'spread_horseshoe': 'horseshoe',
-    'spread_love': 'love_triangle',
-    'spread_celtic': 'celtic_cross',
-    'spread_week': 'week_forecast',
-    'spread_year': 'year_wheel'
-}
+# Mapping между callback_data и конфигурациями - SPREAD_MAPPING из llm_integration
 
 
 async def perform_spread(update, context, spread_type, magic_number, tariff='beginner'):
@@ -214,7 +199,10 @@ async def perform_spread(update, context, spread_type, magic_number, tariff='beg
             "🎨 Генерирую ваш расклад...\n⏳ Это может занять несколько секунд"
         )
         
-        image_bytes = generator.generate_spread_image(
+        # Рендер в отдельном потоке: Pillow отпускает GIL, а цикл событий продолжает
+        # обслуживать других пользователей
+        image_bytes = await asyncio.to_thread(
+            generator.generate_spread_image,
             background_id=config['background_id'],
             cards=selected_cards,
             positions=config['positions'],
@@ -226,7 +214,7 @@ async def perform_spread(update, context, spread_type, magic_number, tariff='beg
         
         # Отправляем изображение БЕЗ кнопки
         image_io = io.BytesIO(image_bytes)
-        image_io.name = f"{spread_type}_spread.png"
+        image_io.name = f"{spread_type}_spread.jpg"
         
         await context.bot.send_photo(
             chat_id=chat_id,
@@ -769,13 +757,14 @@ async def process_preliminary_answers(update: Update, context: ContextTypes.DEFA
         user_input = update.message.text.strip()
         session_data = get_user_data(chat_id)
         
+        # Читаем нужные ключи сессии один раз в начале обработчика
         questions = session_data.get('questions')
         current_question_index = session_data.get('current_question', 0)
         preliminary_answers = session_data.get('preliminary_answers', [])
+        tariff = session_data.get('tariff', 'beginner')  # Получаем выбранный тариф
         
         if not questions or current_question_index >= len(questions.questions):
             # Ошибка состояния - переходим к финализации
-            tariff = session_data.get('tariff', 'beginner')  # Получаем выбранный тариф
             logger.error(f"Некорректное состояние вопросов для пользователя {chat_id}")
             await start_llm_interpretation(update, context, chat_id, session_data, tariff)
             return
@@ -789,16 +778,15 @@ async def process_preliminary_answers(update: Update, context: ContextTypes.DEFA
             'expected_length': current_question.expected_length
         })
         
-        update_data(chat_id, 'preliminary_answers', preliminary_answers)
-        
         logger.info(f"Пользователь {chat_id} ответил на вопрос {current_question_index + 1}: {user_input[:50]}...")
         
         # Переходим к следующему вопросу
         next_question_index = current_question_index + 1
         
         if next_question_index < len(questions.questions):
-            # Есть еще вопросы
-            update_data(chat_id, 'current_question', next_question_index)
+            # Есть еще вопросы - ответ и номер вопроса сохраняем одним обновлением
+            update_data_many(chat_id, preliminary_answers=preliminary_answers,
+                             current_question=next_question_index)
             
             next_question = questions.questions[next_question_index]
             await update.message.reply_text(
@@ -810,7 +798,7 @@ async def process_preliminary_answers(update: Update, context: ContextTypes.DEFA
             )
         else:
             # Все вопросы завершены - переходим к генерации (без лишних сообщений)
-            tariff = session_data.get('tariff', 'beginner')  # Получаем выбранный тариф
+            update_data(chat_id, 'preliminary_answers', preliminary_answers)
             await start_llm_interpretation(update, context, chat_id, session_data, tariff)
         
     except Exception as e:
@@ -835,6 +823,9 @@ async def finalize_spread_generation(update: Update, context: ContextTypes.DEFAU
     :param magic_number: Магическое число
     """
     try:
+        tariff = session_data.get('tariff', 'beginner')  # Получаем выбранный тариф
+        user_name = session_data.get('name', 'Неизвестно')
+        
         # Обновляем время последнего расклада
         update_last_spread(chat_id)
         
@@ -844,7 +835,6 @@ async def finalize_spread_generation(update: Update, context: ContextTypes.DEFAU
         # Проверяем, реализован ли данный расклад
         if spread_type in IMPLEMENTED_SPREADS:
             # Генерируем готовый расклад
-            tariff = session_data.get('tariff', 'beginner')  # Получаем выбранный тариф
             logger.info(f"Генерируем реализованный расклад {spread_type} (тариф: {tariff}) для пользователя {chat_id}")
             await perform_spread(update, context, spread_type, magic_number, tariff)
         else:
@@ -854,7 +844,7 @@ async def finalize_spread_generation(update: Update, context: ContextTypes.DEFAU
             await update.message.reply_text(
                 f"✨ Ваше магическое число {magic_number} принято!\n\n"
                 f"🎴 Расклад: {spread_name}\n"
-                f"👤 Для: {session_data.get('name', 'Неизвестно')}\n\n"
+                f"👤 Для: {user_name}\n\n"
                 "🔧 Этот расклад появится в следующей версии.\n\n"
                 "Попробуйте один из готовых раскладов:",
                 reply_markup=main_menu()
@@ -880,11 +870,12 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         # Сохраняем обратную связь
         session_data = get_user_data(chat_id)
         interpretation_text = session_data.get('interpretation_text', '')
+        spread_type = session_data.get('spread_type')
         
         feedback_data = {
             'chat_id': chat_id,
             'feedback': feedback_type,
-            'spread_type': session_data.get('spread_type'),
+            'spread_type': spread_type,
             'interpretation_length': len(interpretation_text),
             'timestamp': time.time()
         }
@@ -1001,41 +992,52 @@ async def handle_tariff_selection(update: Update, context: ContextTypes.DEFAULT_
         # Сохраняем выбранный тариф и переходим к сбору данных пользователя
         spread_name = SPREAD_NAMES.get(spread_type, "Неизвестный расклад")
         
-        # Проверяем существует ли пользователь
-        if user_exists(user_id=user_id):
-            # Существующий пользователь - проверяем кредиты
-            if not has_credits(user_id, tariff_key):
-                await query.edit_message_text(
-                    "❌ У вас недостаточно кредитов на выбранном тарифе",
-                    reply_markup=back_button("spreads_list")
-                )
-                return
-            
-            # СПИСЫВАЕМ КРЕДИТ СРАЗУ ПОСЛЕ ВЫБОРА ТАРИФА
-            if not use_credit(user_id, tariff_key):
+        # Загружаем пользователя и СПИСЫВАЕМ КРЕДИТ СРАЗУ ПОСЛЕ ВЫБОРА ТАРИФА (одно обращение к хранилищу)
+        try:
+            debited, user_data = fetch_user_and_debit(user_id, tariff_key)
+        except Exception:
+            # Ошибка хранилища - не отправляем существующего пользователя на регистрацию
+            await query.edit_message_text(
+                "❌ Ошибка при списании кредита. Попробуйте позже.",
+                reply_markup=back_button("spreads_list")
+            )
+            return
+        
+        if user_data is not None:
+            # Существующий пользователь - проверяем результат списания
+            if not debited:
+                if user_data.get('credits', {}).get(tariff_key, 0) <= 0:
+                    error_text = "❌ У вас недостаточно кредитов на выбранном тарифе"
+                else:
+                    error_text = "❌ Ошибка при списании кредита. Попробуйте позже."
                 await query.edit_message_text(
-                    "❌ Ошибка при списании кредита. Попробуйте позже.",
+                    error_text,
                     reply_markup=back_button("spreads_list")
                 )
                 return
             
             # Переходим к следующему шагу (магическое число или сразу к вопросам)
-            user_data = get_user(user_id=user_id)
             if user_data:
-                # Обновляем данные сессии
-                set_state(chat_id, UserState.IDLE, {  # Временно устанавливаем IDLE
+                config = load_config()
+                tariff_name = config['tariff_plans'][tariff_key]['name']
+                magic_numbers_enabled = is_magic_numbers_enabled()
+
+                # Обновляем данные сессии одной записью сразу с итоговым состоянием
+                session_update = {
                     'spread_type': spread_type,
                     'tariff': tariff_key,
                     'name': user_data['name'],
                     'age': user_data['age']
-                })
-                
-                config = load_config()
-                tariff_name = config['tariff_plans'][tariff_key]['name']
-                
-                if is_magic_numbers_enabled():
+                }
+                if magic_numbers_enabled:
+                    final_state = UserState.WAITING_MAGIC_NUMBER
+                else:
+                    final_state = UserState.IDLE
+                    session_update['magic_number'] = generate_random_magic_number(user_id)
+                set_state(chat_id, final_state, session_update)
+
+                if magic_numbers_enabled:
                     # Стандартный поток - просим магическое число
-                    set_state(chat_id, UserState.WAITING_MAGIC_NUMBER)
                     await query.edit_message_text(
                         f"🔮 Привет снова, {user_data['name']}!\n\n"
                         f"🎴 Расклад: {spread_name}\n"
@@ -1045,9 +1047,6 @@ async def handle_tariff_selection(update: Update, context: ContextTypes.DEFAULT_
                     )
                 else:
                     # Пропускаем магическое число - переходим сразу к вопросам
-                    random_magic = generate_random_magic_number(user_id)
-                    update_data(chat_id, 'magic_number', random_magic)
-                    
                     await query.edit_message_text(
                         f"🔮 Привет снова, {user_data['name']}!\n\n"
                         f"🎴 Расклад: {spread_name}\n"
@@ -1112,6 +1111,78 @@ async def handle_refill_info(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.error(f"Ошибка при показе информации о пополнении: {e}")
 
 
+# Тексты для каждого шага гида по раскладам
+SPREAD_GUIDE_TEXTS = {
+    1: (
+        "🤔 Какой расклад выбрать?\n\n"
+        "Каждый расклад Таро предназначен для определённых ситуаций. Выбор правильного расклада поможет получить максимально точную и полезную интерпретацию.\n\n"
+        "📚 Ниже представлен гид по всем доступным раскладам:"
+    ),
+    2: (
+        "🎴 **ПРОСТЫЕ РАСКЛАДЫ**\n\n"
+        "✨ **На одну карту**\n"
+        "• Быстрый совет на день\n"
+        "• Простой ответ на конкретный вопрос\n"
+        "• Первое знакомство с Таро\n"
+        "• Ежедневная духовная практика\n"
+        "_Примеры: \"Стоит ли принимать это предложение?\", \"На что обратить внимание сегодня?\"_\n\n"
+        "🔮 **На три карты (Прошлое-Настоящее-Будущее)**\n"
+        "• Понимание развития ситуации во времени\n"
+        "• Анализ причин и следствий\n"
+        "• Планирование ближайших действий\n"
+        "_Примеры: развитие отношений, карьерные изменения, личностный рост_"
+    ),
+    3: (
+        "🎯 **СПЕЦИАЛИЗИРОВАННЫЕ РАСКЛАДЫ**\n\n"
+        "🍀 **Подкова (7 карт)**\n"
+        "• Планирование и достижение целей\n"
+        "• Преодоление препятствий\n"
+        "• Комплексный анализ ситуации\n"
+        "_Примеры: запуск нового проекта, решение сложных проблем, поиск выхода из кризиса_\n\n"
+        "💕 **Любовный треугольник (6 карт)**\n"
+        "• Сложные любовные ситуации\n"
+        "• Выбор между партнерами\n"
+        "• Анализ чувств и эмоций\n"
+        "_Примеры: любовный треугольник, неопределённость в отношениях, решение о разводе_"
+    ),
+    4: (
+        "🔍 **ГЛУБОКИЕ РАСКЛАДЫ**\n\n"
+        "✟ **Кельтский крест (10 карт)**\n"
+        "• Глубокий анализ жизненной ситуации\n"
+        "• Комплексные жизненные вопросы\n"
+        "• Понимание скрытых мотиваций\n"
+        "• Духовный поиск\n"
+        "_Примеры: кардинальные изменения в жизни, поиск предназначения, судьбоносные решения_\n\n"
+        "📅 **Прогноз на неделю (7 карт)**\n"
+        "• Планирование предстоящей недели\n"
+        "• Подготовка к важным событиям\n"
+        "• Понимание энергий каждого дня\n"
+        "_Примеры: важная рабочая неделя, подготовка к экзаменам, период восстановления_"
+    ),
+    5: (
+        "🎡 **ДОЛГОСРОЧНОЕ ПЛАНИРОВАНИЕ**\n\n"
+        "🎡 **Колесо года (12 карт)**\n"
+        "• Планирование года\n"
+        "• Понимание жизненных циклов\n"
+        "• Долгосрочные цели и мечты\n"
+        "• Духовное развитие на год\n"
+        "• Подведение итогов прошедшего года\n\n"
+        "**Идеально подходит для:**\n"
+        "• Начала нового года\n"
+        "• Дня рождения\n"
+        "• Важных жизненных рубежей\n"
+        "• Планирования карьеры\n"
+        "• Семейного планирования\n\n"
+        "💡 **Совет:** Выбирайте расклад исходя из глубины вашего вопроса и времени, которое готовы потратить на размышления."
+    )
+}
+
+SPREAD_GUIDE_STEPS = len(SPREAD_GUIDE_TEXTS)
+
+# Клавиатуры навигации гида строятся один раз при импорте
+_GUIDE_KEYBOARDS = [spread_guide_navigation(step) for step in range(1, SPREAD_GUIDE_STEPS + 1)]
+
+
 async def handle_spread_guide(update: Update, context: ContextTypes.DEFAULT_TYPE, step: int = 1) -> None:
     """
     Показывает гид по раскладам - многошаговое объяснение применения каждого расклада
@@ -1123,77 +1194,13 @@ async def handle_spread_guide(update: Update, context: ContextTypes.DEFAULT_TYPE
     try:
         query = update.callback_query
         
-        # Тексты для каждого шага гида
-        guide_texts = {
-            1: (
-                "🤔 Какой расклад выбрать?\n\n"
-                "Каждый расклад Таро предназначен для определённых ситуаций. Выбор правильного расклада поможет получить максимально точную и полезную интерпретацию.\n\n"
-                "📚 Ниже представлен гид по всем доступным раскладам:"
-            ),
-            2: (
-                "🎴 **ПРОСТЫЕ РАСКЛАДЫ**\n\n"
-                "✨ **На одну карту**\n"
-                "• Быстрый совет на день\n"
-                "• Простой ответ на конкретный вопрос\n"
-                "• Первое знакомство с Таро\n"
-                "• Ежедневная духовная практика\n"
-                "_Примеры: \"Стоит ли принимать это предложение?\", \"На что обратить внимание сегодня?\"_\n\n"
-                "🔮 **На три карты (Прошлое-Настоящее-Будущее)**\n"
-                "• Понимание развития ситуации во времени\n"
-                "• Анализ причин и следствий\n"
-                "• Планирование ближайших действий\n"
-                "_Примеры: развитие отношений, карьерные изменения, личностный рост_"
-            ),
-            3: (
-                "🎯 **СПЕЦИАЛИЗИРОВАННЫЕ РАСКЛАДЫ**\n\n"
-                "🍀 **Подкова (7 карт)**\n"
-                "• Планирование и достижение целей\n"
-                "• Преодоление препятствий\n"
-                "• Комплексный анализ ситуации\n"
-                "_Примеры: запуск нового проекта, решение сложных проблем, поиск выхода из кризиса_\n\n"
-                "💕 **Любовный треугольник (6 карт)**\n"
-                "• Сложные любовные ситуации\n"
-                "• Выбор между партнерами\n"
-                "• Анализ чувств и эмоций\n"
-                "_Примеры: любовный треугольник, неопределённость в отношениях, решение о разводе_"
-            ),
-            4: (
-                "🔍 **ГЛУБОКИЕ РАСКЛАДЫ**\n\n"
-                "✟ **Кельтский крест (10 карт)**\n"
-                "• Глубокий анализ жизненной ситуации\n"
-                "• Комплексные жизненные вопросы\n"
-                "• Понимание скрытых мотиваций\n"
-                "• Духовный поиск\n"
-                "_Примеры: кардинальные изменения в жизни, поиск предназначения, судьбоносные решения_\n\n"
-                "📅 **Прогноз на неделю (7 карт)**\n"
-                "• Планирование предстоящей недели\n"
-                "• Подготовка к важным событиям\n"
-                "• Понимание энергий каждого дня\n"
-                "_Примеры: важная рабочая неделя, подготовка к экзаменам, период восстановления_"
-            ),
-            5: (
-                "🎡 **ДОЛГОСРОЧНОЕ ПЛАНИРОВАНИЕ**\n\n"
-                "🎡 **Колесо года (12 карт)**\n"
-                "• Планирование года\n"
-                "• Понимание жизненных циклов\n"
-                "• Долгосрочные цели и мечты\n"
-                "• Духовное развитие на год\n"
-                "• Подведение итогов прошедшего года\n\n"
-                "**Идеально подходит для:**\n"
-                "• Начала нового года\n"
-                "• Дня рождения\n"
-                "• Важных жизненных рубежей\n"
-                "• Планирования карьеры\n"
-                "• Семейного планирования\n\n"
-                "💡 **Совет:** Выбирайте расклад исходя из глубины вашего вопроса и времени, которое готовы потратить на размышления."
-            )
-        }
-        
-        text = guide_texts.get(step, guide_texts[1])
+        # Неизвестный шаг показываем как первый
+        if not 1 <= step <= SPREAD_GUIDE_STEPS:
+            step = 1
         
         await query.edit_message_text(
-            text=text,
-            reply_markup=spread_guide_navigation(step),
+            text=SPREAD_GUIDE_TEXTS[step],
+            reply_markup=_GUIDE_KEYBOARDS[step - 1],
             parse_mode='Markdown'
         )
         
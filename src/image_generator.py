@@ -2,17 +2,65 @@
 Движок генерации изображений раскладов Таро
 """
 import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Tuple
 from PIL import Image, ImageDraw
 import io
 
+try:
+    from .card_manager import TarotDeck
+    from .spread_configs import SPREAD_CONFIGS
+except ImportError:
+    from card_manager import TarotDeck
+    from spread_configs import SPREAD_CONFIGS
+
+
+logger = logging.getLogger(__name__)
+
+# Папка с фонами раскладов и заранее собранные пути к ним (фоны 1-7)
+BACKGROUNDS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'backgrounds for spreads'
+)
+_BACKGROUND_PATHS = {i: os.path.join(BACKGROUNDS_DIR, f"back{i}.png") for i in range(1, 8)}
+
+# Ожидаемый размер исходного изображения карты
+CARD_SIZE = (350, 600)
+
+# Запас по размеру при черновом декодировании JPEG, чтобы LANCZOS было из чего сглаживать
+DRAFT_MARGIN = 1.5
+
+# Фильтр масштабирования карт. Pillow-SIMD (если установлен вместо Pillow) ускоряет
+# именно его свёртку, код при этом не меняется
+RESAMPLE_FILTER = Image.Resampling.LANCZOS
+
+# Максимум потоков для параллельной подготовки карт расклада
+MAX_PREPARE_WORKERS = 8
+
+# Хранить подготовленные карты в 8-битной палитре (в 3 раза меньше памяти, ценой
+# небольшой потери цвета). Включается переменной окружения при нехватке памяти
+QUANTIZE_CARDS = os.environ.get('TAROT_QUANTIZE_CARDS', '').lower() in ('1', 'true', 'yes')
+
+# Максимальное число подготовленных (масштабированных и повёрнутых) карт в кэше.
+# С запасом вмещает всю колоду во всех сочетаниях масштаба и поворота из SPREAD_CONFIGS
+PREPARED_CACHE_SIZE = 1024
+
+# Суммарный размер готовых закодированных раскладов в кэше ImageGenerator (~200 КБ на расклад)
+RENDERED_CACHE_BYTES = 64 * 1024 * 1024
+
 
 class ImageCache:
     """Кэш для изображений карт и фонов"""
     
-    def __init__(self):
+    def __init__(self, prepared_cache_size: int = PREPARED_CACHE_SIZE):
         self._backgrounds = {}
         self._cards = {}
+        self._prepared = OrderedDict()
+        self._prepared_cache_size = prepared_cache_size
+        # Карты готовятся в нескольких потоках - LRU защищаем блокировкой
+        self._prepared_lock = threading.Lock()
     
     def get_background(self, background_id: int) -> Optional[Image.Image]:
         """Получить фон из кэша"""
@@ -30,20 +78,60 @@ class ImageCache:
         """Сохранить карту в кэш"""
         self._cards[card_path] = image
     
+    def get_prepared(self, key: Tuple[str, float, float]) -> Optional[Tuple[Image.Image, Optional[Image.Image]]]:
+        """Получить подготовленную карту (изображение и маску) из кэша (LRU)"""
+        with self._prepared_lock:
+            prepared = self._prepared.get(key)
+            if prepared is not None:
+                self._prepared.move_to_end(key)
+            return prepared
+    
+    def cache_prepared(self, key: Tuple[str, float, float], prepared: Tuple[Image.Image, Optional[Image.Image]]):
+        """Сохранить подготовленную карту в кэш, вытесняя самые старые записи"""
+        with self._prepared_lock:
+            self._prepared[key] = prepared
+            self._prepared.move_to_end(key)
+            while len(self._prepared) > self._prepared_cache_size:
+                self._prepared.popitem(last=False)
+    
+    def clear_cards(self):
+        """Очистить кэш исходных изображений карт (подготовленные остаются)"""
+        self._cards.clear()
+    
     def clear(self):
         """Очистить кэш"""
         self._backgrounds.clear()
         self._cards.clear()
+        with self._prepared_lock:
+            self._prepared.clear()
 
 
 # Глобальный кэш изображений
 _image_cache = ImageCache()
 
+# Колода для получения путей к изображениям карт (создаётся лениво)
+_deck = None
+
+
+def _get_deck() -> TarotDeck:
+    """
+    Получить общий экземпляр колоды (загружается один раз)
+    
+    :return: Экземпляр TarotDeck
+    """
+    global _deck
+    if _deck is None:
+        _deck = TarotDeck()
+    return _deck
+
 
 def load_background(background_id: int, backgrounds_dir: str = None) -> Image.Image:
     """
     Загрузка фона для расклада
     
+    Возвращается изображение из кэша без копирования - его нельзя изменять,
+    для рисования нужно сделать собственную копию.
+    
     :param background_id: Номер фона (1-7)
     :param backgrounds_dir: Папка с фонами
     :return: PIL Image объект фона
@@ -54,63 +142,125 @@ def load_background(background_id: int, backgrounds_dir: str = None) -> Image.Im
     # Проверяем кэш
     cached = _image_cache.get_background(background_id)
     if cached is not None:
-        return cached.copy()
-    
-    if backgrounds_dir is None:
-        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        backgrounds_dir = os.path.join(project_root, 'assets', 'backgrounds for spreads')
+        return cached
     
     background_file = f"back{background_id}.png"
-    background_path = os.path.join(backgrounds_dir, background_file)
-    
-    if not os.path.exists(background_path):
-        raise FileNotFoundError(f"Фон не найден: {background_path}")
+    if backgrounds_dir is None:
+        background_path = _BACKGROUND_PATHS[background_id]
+    else:
+        background_path = os.path.join(backgrounds_dir, background_file)
     
+    # Отдельный stat не делаем - отсутствие файла сообщит сам Image.open
     try:
         background = Image.open(background_path)
         
         # Проверяем размер фона
         if background.size != (1024, 1024):
-            print(f"⚠️ Предупреждение: размер фона {background.size}, ожидался (1024, 1024)")
+            logger.warning("Размер фона %s: %s, ожидался (1024, 1024)", background_file, background.size)
         
-        # Кэшируем и возвращаем копию
-        _image_cache.cache_background(background_id, background.copy())
+        # Декодируем сразу и закрываем файл, в кэше хранится единственный экземпляр
+        background.load()
+        _image_cache.cache_background(background_id, background)
         return background
         
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Фон не найден: {background_path}")
     except Exception as e:
         raise RuntimeError(f"Ошибка загрузки фона {background_file}: {e}")
 
 
-def load_card_image(card_path: str) -> Image.Image:
+def load_card_image(card_path: str, target_size: Optional[Tuple[int, int]] = None) -> Image.Image:
     """
     Загрузка изображения карты
     
+    Для JPEG при заданном target_size используется Image.draft: libjpeg уменьшает
+    картинку в степень двойки прямо при декодировании, не меньше target_size.
+    Возвращается изображение из кэша без копирования - его нельзя изменять.
+    
     :param card_path: Полный путь к изображению карты
+    :param target_size: Минимальный нужный размер (ширина, высота) или None для полного декодирования
     :return: PIL Image объект карты
     """
+    cache_key = card_path if target_size is None else (card_path, target_size)
+    
     # Проверяем кэш
-    cached = _image_cache.get_card(card_path)
+    cached = _image_cache.get_card(cache_key)
     if cached is not None:
-        return cached.copy()
-    
-    if not os.path.exists(card_path):
-        raise FileNotFoundError(f"Изображение карты не найдено: {card_path}")
+        return cached
     
+    # Отдельный stat не делаем - отсутствие файла сообщит сам open
     try:
-        card = Image.open(card_path)
+        # Небольшой JPEG читаем целиком одним системным вызовом, вместо чтения
+        # блоками по 8 КБ во время декодирования
+        with open(card_path, 'rb') as f:
+            card = Image.open(io.BytesIO(f.read()))
         
         # Проверяем размер карты
-        if card.size != (350, 600):
-            print(f"⚠️ Предупреждение: размер карты {card.size}, ожидался (350, 600)")
+        if card.size != CARD_SIZE:
+            logger.warning("Размер карты %s: %s, ожидался %s", os.path.basename(card_path), card.size, CARD_SIZE)
+        
+        if target_size is not None and card.format == 'JPEG':
+            card.draft('RGB', target_size)
         
-        # Кэшируем и возвращаем копию
-        _image_cache.cache_card(card_path, card.copy())
+        # Декодируем сразу, чтобы в кэше лежало готовое изображение, а не ленивый файл
+        card.load()
+        
+        _image_cache.cache_card(cache_key, card)
         return card
         
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Изображение карты не найдено: {card_path}")
     except Exception as e:
         raise RuntimeError(f"Ошибка загрузки карты {os.path.basename(card_path)}: {e}")
 
 
+def load_prepared_card(
+    card_path: str,
+    scale: float = 1.0,
+    rotation: float = 0
+) -> Tuple[Image.Image, Optional[Image.Image]]:
+    """
+    Загрузка карты, уже масштабированной и повёрнутой, с кэшированием результата
+    
+    Прозрачность повёрнутой карты отдаётся отдельной L-маской поверх RGB-изображения:
+    вставка RGB с готовой маской заметно быстрее, чем RGBA с маской из собственного альфа-канала.
+    Возвращаемые изображения разделяются между вызовами - их нельзя изменять.
+    
+    :param card_path: Полный путь к изображению карты
+    :param scale: Коэффициент масштабирования
+    :param rotation: Угол поворота в градусах (по часовой стрелке)
+    :return: Кортеж (PIL Image карты, готовой к вставке на фон; маска прозрачности или None)
+    """
+    key = (card_path, round(scale, 3), round(rotation, 1))
+    
+    cached = _image_cache.get_prepared(key)
+    if cached is not None:
+        return cached
+    
+    if scale != 1.0:
+        # Итоговый размер считаем от исходного, как scale_image, а декодируем с запасом
+        final_size = (int(CARD_SIZE[0] * scale), int(CARD_SIZE[1] * scale))
+        target_size = (int(final_size[0] * DRAFT_MARGIN), int(final_size[1] * DRAFT_MARGIN))
+        card = load_card_image(card_path, target_size)
+        
+        if card.size == CARD_SIZE:
+            card = scale_image(card, scale)
+        elif card.size != final_size:
+            card = card.resize(final_size, RESAMPLE_FILTER)
+    else:
+        card = load_card_image(card_path)
+    
+    card, mask = _rotate_with_mask(card, rotation)
+    
+    if QUANTIZE_CARDS and card.mode == 'RGB':
+        # paste сам разворачивает палитру в режим холста через таблицу
+        card = card.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+    
+    prepared = (card, mask)
+    _image_cache.cache_prepared(key, prepared)
+    return prepared
+
+
 def scale_image(image: Image.Image, scale_factor: float) -> Image.Image:
     """
     Масштабирование изображения
@@ -129,7 +279,15 @@ def scale_image(image: Image.Image, scale_factor: float) -> Image.Image:
     if new_width <= 0 or new_height <= 0:
         raise ValueError(f"Результирующий размер некорректен: {new_width}x{new_height}")
     
-    return image.resize((new_width, new_height), Image.LANCZOS)
+    return image.resize((new_width, new_height), RESAMPLE_FILTER)
+
+
+# Повороты по часовой стрелке на прямой угол как транспонирование изображения
+_RIGHT_ANGLE_TRANSPOSE = {
+    90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_90,
+}
 
 
 def rotate_image(image: Image.Image, rotation: float) -> Image.Image:
@@ -140,9 +298,15 @@ def rotate_image(image: Image.Image, rotation: float) -> Image.Image:
     :param rotation: Угол поворота в градусах (по часовой стрелке)
     :return: Повёрнутое изображение с прозрачным фоном
     """
-    if rotation == 0:
+    if rotation % 360 == 0:
         return image
     
+    # Повороты на прямой угол - это перестановка пикселей без интерполяции и пустых углов,
+    # поэтому альфа-канал не нужен
+    right_angle = _RIGHT_ANGLE_TRANSPOSE.get(rotation % 360)
+    if right_angle is not None:
+        return image.transpose(right_angle)
+    
     # Конвертируем в RGBA если нужно для поддержки прозрачности
     if image.mode != 'RGBA':
         image = image.convert('RGBA')
@@ -154,6 +318,37 @@ def rotate_image(image: Image.Image, rotation: float) -> Image.Image:
     return rotated
 
 
+def _rotate_with_mask(image: Image.Image, rotation: float) -> Tuple[Image.Image, Optional[Image.Image]]:
+    """
+    Поворот карты с отдельной маской прозрачности вместо альфа-канала
+    
+    Непрозрачная RGB-карта поворачивается как есть, а маска получается поворотом
+    белого L-прямоугольника того же размера - без промежуточной конвертации в RGBA и обратно.
+    
+    :param image: PIL Image для поворота
+    :param rotation: Угол поворота в градусах (по часовой стрелке)
+    :return: Кортеж (повёрнутое изображение, маска прозрачности или None если она не нужна)
+    """
+    if image.mode == 'RGBA':
+        rotated = rotate_image(image, rotation)
+        if rotated.mode != 'RGBA':
+            return rotated, None
+        return rotated.convert('RGB'), rotated.getchannel('A')
+    
+    if rotation % 360 == 0:
+        return image, None
+    
+    if rotation % 360 in _RIGHT_ANGLE_TRANSPOSE:
+        return rotate_image(image, rotation), None
+    
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    rotated = image.rotate(-rotation, expand=True, fillcolor=(0, 0, 0))
+    mask = Image.new('L', image.size, 255).rotate(-rotation, expand=True, fillcolor=0)
+    return rotated, mask
+
+
 def place_card_on_background(
     background: Image.Image,
     card: Image.Image,
@@ -175,42 +370,121 @@ def place_card_on_background(
     """
     # Создаём копию фона для работы
     result = background.copy()
+    _composite_card(result, card, x, y, rotation, scale)
+    return result
+
+
+def _composite_card(
+    canvas: Image.Image,
+    card: Image.Image,
+    x: int,
+    y: int,
+    rotation: float = 0,
+    scale: float = 1.0,
+    mask: Optional[Image.Image] = None
+) -> None:
+    """
+    Размещение карты на холсте на месте (без копирования холста)
     
+    :param canvas: Холст, изменяется на месте
+    :param card: Изображение карты
+    :param x: X координата центра карты (в рабочей области)
+    :param y: Y координата центра карты (в рабочей области)
+    :param rotation: Угол поворота карты в градусах
+    :param scale: Коэффициент масштабирования
+    :param mask: Готовая маска прозрачности для уже подготовленной карты
+    """
     # Масштабируем карту
     if scale != 1.0:
         card = scale_image(card, scale)
     
     # Поворачиваем карту если нужно
-    if rotation != 0:
+    if rotation % 360 != 0:
         card = rotate_image(card, rotation)
     
-    # Преобразуем координаты из рабочей области в абсолютные координаты фона
-    # Рабочая область 512x512 начинается с (256, 256) на фоне 1024x1024
-    abs_x = x + 256  # Сдвиг на начало рабочей области по X
-    abs_y = y + 256  # Сдвиг на начало рабочей области по Y
+    if mask is None and (card.mode in ('RGBA', 'LA') or 'transparency' in card.info):
+        # Если у карты есть прозрачность (альфа-канал), используем её для корректного наложения
+        mask = card
     
-    # Вычисляем позицию для вставки (левый верхний угол карты)
+    _paste_prepared(canvas, card, mask, x, y)
+
+
+def _paste_prepared(
+    canvas: Image.Image,
+    card: Image.Image,
+    mask: Optional[Image.Image],
+    x: int,
+    y: int
+) -> None:
+    """
+    Вставка уже подготовленной карты (масштабированной и повёрнутой) на холст
+    
+    :param canvas: Холст, изменяется на месте
+    :param card: Подготовленное изображение карты
+    :param mask: Маска прозрачности или None для непрозрачной карты
+    :param x: X координата центра карты (в рабочей области)
+    :param y: Y координата центра карты (в рабочей области)
+    """
+    # Преобразуем координаты из рабочей области в абсолютные координаты фона
+    # Рабочая область 512x512 начинается с (256, 256) на фоне 1024x1024,
+    # x и y - центр карты
     card_width, card_height = card.size
-    paste_x = abs_x - card_width // 2   # x - это центр карты
-    paste_y = abs_y - card_height // 2  # y - это центр карты
+    paste_x = x + 256 - card_width // 2
+    paste_y = y + 256 - card_height // 2
+    
+    # Видимая часть карты - пересечение её прямоугольника с холстом
+    canvas_width, canvas_height = canvas.size
+    x0 = max(paste_x, 0)
+    y0 = max(paste_y, 0)
+    x1 = min(paste_x + card_width, canvas_width)
+    y1 = min(paste_y + card_height, canvas_height)
     
-    # Размещаем карту на фоне
     try:
-        # Проверяем, что карта умещается на фоне
-        if paste_x < 0 or paste_y < 0 or paste_x + card_width > 1024 or paste_y + card_height > 1024:
-            print(f"⚠️ Предупреждение: карта частично выходит за границы фона")
-            print(f"   Позиция: ({paste_x}, {paste_y}), размер карты: {card_width}x{card_height}")
+        if (x0, y0, x1, y1) != (paste_x, paste_y, paste_x + card_width, paste_y + card_height):
+            logger.warning(
+                "Карта частично выходит за границы фона: позиция (%d, %d), размер %dx%d",
+                paste_x, paste_y, card_width, card_height
+            )
+            
+            if x1 <= x0 or y1 <= y0:
+                return
+            
+            # Обрезаем карту (и маску) до видимой части один раз
+            box = (x0 - paste_x, y0 - paste_y, x1 - paste_x, y1 - paste_y)
+            card = card.crop(box)
+            if mask is not None:
+                mask = mask.crop(box)
         
-        # Если у карты есть прозрачность (альфа-канал), используем её для корректного наложения
-        if card.mode in ('RGBA', 'LA') or 'transparency' in card.info:
-            result.paste(card, (paste_x, paste_y), card)
-        else:
-            result.paste(card, (paste_x, paste_y))
+        canvas.paste(card, (x0, y0), mask)
             
     except Exception as e:
         raise RuntimeError(f"Ошибка размещения карты на позиции ({paste_x}, {paste_y}): {e}")
+
+
+def _prepare_card(
+    deck: TarotDeck,
+    card: Dict,
+    position: Dict,
+    scale: float
+) -> Tuple[Image.Image, Optional[Image.Image], int, int, float]:
+    """
+    Подготовка одной карты расклада к наложению (выполняется в пуле потоков)
     
-    return result
+    :param deck: Колода для получения пути к изображению карты
+    :param card: Данные карты
+    :param position: Позиция карты из конфигурации расклада
+    :param scale: Коэффициент масштабирования
+    :return: Кортеж (изображение карты, маска или None, x, y, угол поворота)
+    """
+    card_path = deck.get_card_image_path(card)
+    
+    x = position.get('x', 256)
+    y = position.get('y', 256)
+    rotation = position.get('rotation', 0)
+    
+    # Загружаем карту, уже масштабированную и повёрнутую (из кэша при повторе)
+    card_image, card_mask = load_prepared_card(card_path, scale, rotation)
+    return card_image, card_mask, x, y, rotation
 
 
 def generate_spread_image(
@@ -239,49 +513,58 @@ def generate_spread_image(
     if len(cards) != len(positions):
         raise ValueError(f"Количество карт ({len(cards)}) не совпадает с количеством позиций ({len(positions)})")
     
-    print(f"🎨 Генерируем расклад: {len(cards)} карт, фон {background_id}, scale {scale_factor}")
+    logger.debug("Генерируем расклад: %d карт, фон %d, scale %s", len(cards), background_id, scale_factor)
     
-    # Загружаем фон
+    # Загружаем фон и делаем единственную рабочую копию на весь расклад
     try:
-        background = load_background(background_id)
+        result = load_background(background_id).copy()
     except Exception as e:
         raise RuntimeError(f"Ошибка загрузки фона: {e}")
     
-    # Размещаем карты на фоне
-    result = background
+    # Готовим карты параллельно (Pillow отпускает GIL при декодировании и масштабировании),
+    # а накладываем строго по порядку позиций
+    deck = _get_deck()
     
-    for i, (card, position) in enumerate(zip(cards, positions)):
-        try:
-            # Получаем путь к изображению карты
+    with ThreadPoolExecutor(max_workers=min(MAX_PREPARE_WORKERS, len(cards))) as executor:
+        futures = [
+            executor.submit(_prepare_card, deck, card, position, scale_factor)
+            for card, position in zip(cards, positions)
+        ]
+        
+        for i, (card, future) in enumerate(zip(cards, futures)):
             try:
-                from .card_manager import TarotDeck
-            except ImportError:
-                from card_manager import TarotDeck
-            deck = TarotDeck()  # Временное решение для получения пути к карте
-            card_path = deck.get_card_image_path(card)
-            
-            # Загружаем изображение карты
-            card_image = load_card_image(card_path)
-            
-            # Получаем позицию и параметры
-            x = position.get('x', 256)
-            y = position.get('y', 256)
-            rotation = position.get('rotation', 0)
-            
-            print(f"   Размещаем карту {i+1}: {card['name']} на ({x}, {y}), поворот {rotation}°")
-            
-            # Размещаем карту на фоне
-            result = place_card_on_background(
-                result, card_image, x, y, rotation, scale_factor
-            )
-            
-        except Exception as e:
-            raise RuntimeError(f"Ошибка размещения карты {i+1} ({card.get('name', 'unknown')}): {e}")
-    
-    print(f"✅ Расклад сгенерирован успешно!")
+                card_image, card_mask, x, y, rotation = future.result()
+                
+                logger.debug("Размещаем карту %d: %s на (%d, %d), поворот %s°", i + 1, card['name'], x, y, rotation)
+                
+                # Карта уже подготовлена - сразу вставляем её на фон, без копии всего фона
+                _paste_prepared(result, card_image, card_mask, x, y)
+                
+            except Exception as e:
+                raise RuntimeError(f"Ошибка размещения карты {i+1} ({card.get('name', 'unknown')}): {e}")
+    
+    logger.debug("Расклад сгенерирован")
     return result
 
 
+def _flatten_to_rgb(image: Image.Image) -> Image.Image:
+    """
+    Приведение изображения к RGB с заливкой прозрачности белым
+    
+    :param image: PIL Image в любом режиме
+    :return: RGB-изображение (исходное, если оно уже в RGB)
+    """
+    if image.mode not in ('RGBA', 'P'):
+        return image
+    
+    # Создаём белый фон для прозрачных изображений
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    if image.mode == 'P':
+        image = image.convert('RGBA')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
 def save_image_optimized(image: Image.Image, file_path: str, max_size_mb: float = 2.0) -> int:
     """
     Сохранение изображения с оптимизацией размера файла
@@ -291,48 +574,46 @@ def save_image_optimized(image: Image.Image, file_path: str, max_size_mb: float
     :param max_size_mb: Максимальный размер файла в МБ
     :return: Размер сохранённого файла в байтах
     """
-    # Пробуем разные уровни качества для достижения нужного размера
-    quality_levels = [95, 90, 85, 80, 75, 70]
-    
-    for quality in quality_levels:
-        # Создаём буфер для тестирования размера
-        buffer = io.BytesIO()
-        
-        # Конвертируем в RGB если нужно (для JPEG сохранения)
-        save_image = image
-        if image.mode in ('RGBA', 'P'):
-            # Создаём белый фон для прозрачных изображений
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            if image.mode == 'P':
-                image = image.convert('RGBA')
-            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-            save_image = background
-        
-        # Определяем формат по расширению
-        format_type = 'PNG' if file_path.lower().endswith('.png') else 'JPEG'
-        
-        if format_type == 'PNG':
-            save_image.save(buffer, format='PNG', optimize=True)
-        else:
-            save_image.save(buffer, format='JPEG', quality=quality, optimize=True)
-        
-        file_size = buffer.tell()
-        max_bytes = max_size_mb * 1024 * 1024
-        
-        if file_size <= max_bytes or quality == quality_levels[-1]:
-            # Сохраняем файл
+    # Конвертируем в RGB один раз - от уровня качества это не зависит
+    save_image = _flatten_to_rgb(image)
+    
+    # Определяем формат по расширению
+    format_type = 'PNG' if file_path.lower().endswith('.png') else 'JPEG'
+    max_bytes = max_size_mb * 1024 * 1024
+    
+    buffer = io.BytesIO()
+    
+    if format_type == 'PNG':
+        # Для PNG качество не применяется - кодируем один раз
+        quality = None
+        save_image.save(buffer, format='PNG', optimize=True)
+    else:
+        # Подбираем качество быстрыми пробными кодированиями без оптимизации Хаффмана,
+        # переиспользуя один буфер
+        quality_levels = [95, 90, 85, 80, 75, 70]
+        for quality in quality_levels:
             buffer.seek(0)
-            with open(file_path, 'wb') as f:
-                f.write(buffer.getvalue())
-            
-            size_mb = file_size / (1024 * 1024)
-            print(f"💾 Изображение сохранено: {file_path}")
-            print(f"📊 Размер файла: {size_mb:.2f} МБ (качество: {quality if format_type == 'JPEG' else 'PNG'})")
-            return file_size
+            buffer.truncate()
+            save_image.save(buffer, format='JPEG', quality=quality)
+            if buffer.tell() <= max_bytes:
+                break
         
-        buffer.close()
+        # Финальное кодирование с оптимизацией только для выбранного качества - оно не больше пробного
+        buffer.seek(0)
+        buffer.truncate()
+        save_image.save(buffer, format='JPEG', quality=quality, optimize=True)
     
-    return 0
+    file_size = buffer.tell()
+    
+    # Пишем прямо из буфера, без промежуточной копии bytes
+    with open(file_path, 'wb', buffering=1024 * 1024) as f:
+        f.write(buffer.getbuffer())
+    
+    logger.info(
+        "Изображение сохранено: %s, %.2f МБ (качество: %s)",
+        file_path, file_size / (1024 * 1024), quality if format_type == 'JPEG' else 'PNG'
+    )
+    return file_size
 
 
 # Тестовые функции
@@ -387,11 +668,47 @@ def test_single_card():
         raise
 
 
+def warm_cache(scale_rotations: Optional[List[Tuple[float, float]]] = None) -> int:
+    """
+    Предварительная подготовка всех карт колоды для раскладов
+    
+    Вызывается один раз при запуске бота: после неё генерация расклада
+    не читает диск и не масштабирует карты. Заодно загружаются фоны всех раскладов.
+    
+    :param scale_rotations: Пары (масштаб, поворот); по умолчанию все пары из SPREAD_CONFIGS
+    :return: Количество подготовленных изображений
+    """
+    if scale_rotations is None:
+        scale_rotations = sorted({
+            (config['scale'], position.get('rotation', 0))
+            for config in SPREAD_CONFIGS.values()
+            for position in config['positions']
+        })
+    
+    for background_id in sorted({config['background_id'] for config in SPREAD_CONFIGS.values()}):
+        load_background(background_id)
+    
+    deck = _get_deck()
+    prepared = 0
+    
+    for card in deck.cards:
+        card_path = deck.get_card_image_path(card)
+        for scale, rotation in scale_rotations:
+            load_prepared_card(card_path, scale, rotation)
+            prepared += 1
+    
+    # Исходники нужны только для подготовки - все расклады теперь берут карты из LRU
+    _image_cache.clear_cards()
+    
+    logger.info("Кэш изображений прогрет: %d карт", prepared)
+    return prepared
+
+
 def clear_image_cache():
     """Очистка кэша изображений"""
     global _image_cache
     _image_cache.clear()
-    print("🧹 Кэш изображений очищен")
+    logger.info("Кэш изображений очищен")
 
 
 class ImageGenerator:
@@ -400,21 +717,72 @@ class ImageGenerator:
     Обертка над функцией generate_spread_image для удобства использования
     """
     
-    def __init__(self):
-        """Инициализация генератора изображений"""
-        pass
+    def __init__(self, rendered_cache_bytes: int = RENDERED_CACHE_BYTES):
+        """
+        Инициализация генератора изображений
+        
+        :param rendered_cache_bytes: Лимит памяти под готовые изображения раскладов
+        """
+        # Фон, карты, позиции и масштаб полностью определяют картинку, поэтому готовые
+        # байты переиспользуются (LRU с лимитом по размеру). Генерация идёт в потоках - нужна блокировка
+        self._rendered = OrderedDict()
+        self._rendered_bytes = 0
+        self._rendered_limit = rendered_cache_bytes
+        self._rendered_lock = threading.Lock()
+    
+    @staticmethod
+    def _render_key(background_id: int, cards: List[Dict], positions: List[Dict],
+                    scale: float, image_format: str) -> tuple:
+        """Ключ кэша готового изображения (порядок карт важен - они перекрывают друг друга)"""
+        return (
+            background_id,
+            tuple(card['img'] for card in cards),
+            tuple((p.get('x', 256), p.get('y', 256), p.get('rotation', 0)) for p in positions),
+            scale,
+            image_format.lower()
+        )
+    
+    def _get_rendered(self, key: tuple) -> Optional[bytes]:
+        """Получить готовое изображение из кэша"""
+        with self._rendered_lock:
+            data = self._rendered.get(key)
+            if data is not None:
+                self._rendered.move_to_end(key)
+            return data
+    
+    def _cache_rendered(self, key: tuple, data: bytes):
+        """Сохранить готовое изображение, вытесняя самые старые до лимита по размеру"""
+        with self._rendered_lock:
+            if key in self._rendered:
+                return
+            self._rendered[key] = data
+            self._rendered_bytes += len(data)
+            while self._rendered_bytes > self._rendered_limit and self._rendered:
+                _, evicted = self._rendered.popitem(last=False)
+                self._rendered_bytes -= len(evicted)
     
     def generate_spread_image(self, background_id: int, cards: List[Dict], 
-                            positions: List[Dict], scale: float) -> bytes:
+                            positions: List[Dict], scale: float,
+                            image_format: str = 'jpeg') -> bytes:
         """
         Генерирует изображение расклада и возвращает его как байты
         
+        По умолчанию отдаётся JPEG: для фотографичного расклада он в разы меньше PNG,
+        быстрее кодируется, а Telegram всё равно пережимает фото. Повторный расклад
+        с теми же картами и раскладкой отдаётся из кэша без отрисовки.
+        
         :param background_id: Номер фона (1-7)
         :param cards: Список карт от card_manager
         :param positions: Список позиций карт
         :param scale: Масштаб карт
-        :return: Байты PNG изображения
+        :param image_format: Формат результата: 'jpeg' или 'png'
+        :return: Байты изображения в выбранном формате
         """
+        cache_key = self._render_key(background_id, cards, positions, scale, image_format)
+        cached = self._get_rendered(cache_key)
+        if cached is not None:
+            return cached
+        
         # Формируем конфигурацию в ожидаемом формате
         layout_config = {
             'positions': positions,
@@ -424,22 +792,20 @@ class ImageGenerator:
         # Генерируем изображение
         image = generate_spread_image(background_id, cards, layout_config)
         
-        # Конвертируем в байты PNG
         buffer = io.BytesIO()
         
         # Убеждаемся что изображение в RGB для корректного сохранения
-        if image.mode in ('RGBA', 'P'):
-            # Создаём белый фон для прозрачных изображений  
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            if image.mode == 'P':
-                image = image.convert('RGBA')
-            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-            image = background
-        
-        # Сохраняем как PNG с оптимизацией
-        image.save(buffer, format='PNG', optimize=True)
-        
-        return buffer.getvalue()
+        image = _flatten_to_rgb(image)
+        
+        if image_format.lower() == 'png':
+            image.save(buffer, format='PNG', optimize=True)
+        else:
+            image.save(buffer, format='JPEG', quality=85, optimize=True, progressive=True)
+        
+        logger.debug("Изображение расклада: %s, %d КБ", image_format.upper(), buffer.tell() // 1024)
+        data = buffer.getvalue()
+        self._cache_rendered(cache_key, data)
+        return data
 
 
 # Тестирование модуля
@@ -1,22 +1,39 @@
 """
 Inline-клавиатуры для телеграм-бота "Личный Таролог ✨🔮✨"
 """
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from typing import Dict, Any
 
 
+# Неизменяемые клавиатуры строятся один раз при импорте модуля
+_MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🎯 Сделать расклад", callback_data="spreads_list")],
+    [InlineKeyboardButton("💰 Мои расклады", callback_data="my_credits")],
+    [InlineKeyboardButton("❓ Помощь", callback_data="help")]
+])
+
+
 def main_menu() -> InlineKeyboardMarkup:
     """
     Главное меню бота
     
     :return: Inline-клавиатура с основными опциями
     """
-    keyboard = [
-        [InlineKeyboardButton("🎯 Сделать расклад", callback_data="spreads_list")],
-        [InlineKeyboardButton("💰 Мои расклады", callback_data="my_credits")],
-        [InlineKeyboardButton("❓ Помощь", callback_data="help")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _MAIN_MENU_KEYBOARD
+
+
+_SPREADS_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("1️⃣ На одну карту", callback_data="spread_single")],
+    [InlineKeyboardButton("3️⃣ На три карты", callback_data="spread_three")],
+    [InlineKeyboardButton("🍀 Подкова", callback_data="spread_horseshoe")],
+    [InlineKeyboardButton("❤️ Любовный треугольник", callback_data="spread_love")],
+    [InlineKeyboardButton("✝️ Кельтский крест", callback_data="spread_celtic")],
+    [InlineKeyboardButton("📅 Прогноз на неделю", callback_data="spread_week")],
+    [InlineKeyboardButton("🎡 Колесо года", callback_data="spread_year")],
+    [InlineKeyboardButton("🤔 Какой расклад выбрать?", callback_data="spread_guide")],
+    [InlineKeyboardButton("◀️ Назад", callback_data="back_to_main")]
+])
 
 
 def spreads_menu() -> InlineKeyboardMarkup:
@@ -25,23 +42,14 @@ def spreads_menu() -> InlineKeyboardMarkup:
     
     :return: Inline-клавиатура со всеми 7 типами раскладов
     """
-    keyboard = [
-        [InlineKeyboardButton("1️⃣ На одну карту", callback_data="spread_single")],
-        [InlineKeyboardButton("3️⃣ На три карты", callback_data="spread_three")],
-        [InlineKeyboardButton("🍀 Подкова", callback_data="spread_horseshoe")],
-        [InlineKeyboardButton("❤️ Любовный треугольник", callback_data="spread_love")],
-        [InlineKeyboardButton("✝️ Кельтский крест", callback_data="spread_celtic")],
-        [InlineKeyboardButton("📅 Прогноз на неделю", callback_data="spread_week")],
-        [InlineKeyboardButton("🎡 Колесо года", callback_data="spread_year")],
-        [InlineKeyboardButton("🤔 Какой расклад выбрать?", callback_data="spread_guide")],
-        [InlineKeyboardButton("◀️ Назад", callback_data="back_to_main")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _SPREADS_MENU_KEYBOARD
 
 
+@lru_cache(maxsize=16)
 def back_button(callback_data: str) -> InlineKeyboardMarkup:
     """
     Создает клавиатуру с одной кнопкой "Назад"
+    Результат кэшируется: набор callback_data небольшой и фиксированный
     
     :param callback_data: Callback данные для возврата (например: "back_to_main", "back_to_spreads")
     :return: Inline-клавиатура с кнопкой "Назад"
@@ -52,13 +60,16 @@ def back_button(callback_data: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
+_HELP_MENU_KEYBOARD = back_button("back_to_main")
+
+
 def help_menu() -> InlineKeyboardMarkup:
     """
     Меню помощи с кнопкой возврата
     
     :return: Inline-клавиатура для экрана помощи
     """
-    return back_button("back_to_main")
+    return _HELP_MENU_KEYBOARD
 
 
 def tariff_selection_menu(spread_type: str, credits: Dict[str, int], config: Dict[str, Any]) -> InlineKeyboardMarkup:
@@ -106,7 +117,7 @@ def credits_info_menu() -> InlineKeyboardMarkup:
     
     :return: Inline-клавиатура для экрана с информацией о кредитах
     """
-    return back_button("back_to_main")
+    return _HELP_MENU_KEYBOARD
 
 
 def spread_guide_navigation(step: int = 1) -> InlineKeyboardMarkup:
@@ -0,0 +1,185 @@
+"""
+Дисковый кэш ответов LLM для повторяющихся запросов
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Кэш ответов LLM в виде каталога JSON-файлов
+
+    Ключ - хэш модели, параметров генерации и полной истории сообщений, поэтому
+    любое изменение промптов или ответов пользователя даёт новый ключ.
+    Устаревание определяется по времени изменения файла. Общий размер каталога
+    ограничен: при превышении лимита удаляются самые старые записи.
+    """
+
+    def __init__(self, cache_dir: str = "data/llm_cache", ttl_seconds: int = 24 * 60 * 60,
+                 max_size_bytes: int = 1 << 30):
+        """
+        :param cache_dir: Каталог для файлов кэша
+        :param ttl_seconds: Время жизни записи в секундах
+        :param max_size_bytes: Максимальный суммарный размер файлов кэша
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        # Текущий размер каталога; считается при первой записи и дальше ведётся приблизительно
+        self._size_bytes = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], max_tokens: int, temperature: float) -> str:
+        """
+        Строит ключ кэша для запроса
+
+        :param model: Название модели
+        :param messages: История сообщений запроса
+        :param max_tokens: Максимальное количество токенов в ответе
+        :param temperature: Температура генерации
+        :return: Хэш запроса (sha256, hex)
+        """
+        payload = json.dumps(
+            {
+                "model": model,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "messages": messages
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Путь к файлу записи"""
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, key: str) -> Optional[str]:
+        """Синхронное чтение записи (выполняется в отдельном потоке)"""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("response")
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, response: str):
+        """Синхронная запись (выполняется в отдельном потоке)"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # Уникальный временный файл: одновременные записи одного ключа не портят друг друга
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"response": response, "created": time.time()}, f, ensure_ascii=False)
+            try:
+                replaced_size = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced_size = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        
+        if self._size_bytes is None:
+            self._size_bytes = sum(size for _, _, size in self._entries())
+        else:
+            self._size_bytes += os.path.getsize(path) - replaced_size
+        if self._size_bytes > self.max_size_bytes:
+            self._evict()
+
+    def _entries(self) -> List[Tuple[float, str, int]]:
+        """Записи кэша в виде (mtime, путь, размер)"""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """Удаляет самые старые записи, пока размер не опустится до 90% лимита"""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = self.max_size_bytes * 0.9
+        for _, path, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size_bytes = total
+        logger.info(f"Кэш LLM очищен до {total} байт")
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Получить ответ из кэша
+
+        :param key: Ключ запроса
+        :return: Сохранённый ответ или None
+        """
+        try:
+            response = await asyncio.to_thread(self._read, key)
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кэша LLM {key[:12]}: {e}")
+            response = None
+        
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Количество попаданий и промахов кэша с момента запуска"""
+        return {"hits": self.hits, "misses": self.misses}
+    
+    async def set(self, key: str, response: str):
+        """
+        Сохранить ответ в кэш
+
+        :param key: Ключ запроса
+        :param response: Ответ модели
+        """
+        try:
+            await asyncio.to_thread(self._write, key, response)
+        except Exception as e:
+            logger.warning(f"Ошибка записи кэша LLM {key[:12]}: {e}")
+
+
+# Глобальный экземпляр кэша
+_llm_cache = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Получает глобальный экземпляр кэша ответов LLM"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
@@ -3,35 +3,257 @@
 """
 
 import asyncio
+import functools
 import logging
-from typing import List, Optional, Dict, Any
+import re
+from types import MappingProxyType
+from typing import Final, List, Mapping, Optional, Dict, Any, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TimedOut, NetworkError, RetryAfter
+from telegram.helpers import escape_markdown
 from telegram.ext import ContextTypes
 
 from src.llm_session import MultiStageLLMSession as LLMSession, InterpretationStage
-from src.prompt_manager import PromptManager
-from src.openrouter_client import TarotLLMAgent
-from src.simple_state import UserState, set_state, get_user_data, update_data, reset_to_idle, get_messages_to_delete, clear_messages_to_delete
-from src.card_manager import TarotDeck, select_cards
-from src.image_generator import ImageGenerator
+from src.openrouter_client import TarotLLMAgent, OpenRouterError
+from src.simple_state import UserState, set_state, get_user_data, update_data, update_data_many, remove_data, reset_to_idle, get_messages_to_delete, clear_messages_to_delete, add_message_to_delete
 from src.spread_configs import get_spread_config
-from src.user_manager import update_last_spread
 from src.config import load_config
 from src.progress_bar import create_progress_bar, InterpretationProgress
 from src.spread_logger import get_spread_logger
-from src.feedback_system import get_feedback_system
+from src.keyboards import main_menu, SPREAD_NAMES
 
 logger = logging.getLogger(__name__)
 
+# Соответствие callback-ключей раскладов ключам SPREAD_CONFIGS (неизменяемое)
+SPREAD_MAPPING: Final[Mapping[str, str]] = MappingProxyType({
+    'spread_single': 'single_card',
+    'spread_three': 'three_cards',
+    'spread_horseshoe': 'horseshoe',
+    'spread_love': 'love_triangle',
+    'spread_celtic': 'celtic_cross',
+    'spread_week': 'week_forecast',
+    'spread_year': 'year_wheel'
+})
+
+# Конфигурации раскладов, разрешённые один раз при импорте: ключ (callback или название
+# из конфигурации) -> (название расклада, конфигурация)
+_SPREAD_RECORDS: Final[Mapping[str, Tuple[str, Dict]]] = MappingProxyType({
+    **{name: (name, get_spread_config(name)) for name in SPREAD_MAPPING.values()},
+    **{callback: (name, get_spread_config(name)) for callback, name in SPREAD_MAPPING.items()},
+})
+
+
+def resolve_spread(spread_type: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Находит название и конфигурацию расклада по callback_data или названию
+    
+    :param spread_type: callback_data кнопки расклада или название из конфигурации
+    :return: (название расклада, конфигурация или None если расклад неизвестен)
+    """
+    return _SPREAD_RECORDS.get(spread_type, (spread_type, None))
+
+# Маркеры финальной интерпретации в ответе LLM (см. MultiStageLLMSession._parse_final_interpretation)
+_INTERPRETATION_START_RE = re.compile(r'\[INTERPRETATION_START\]', re.IGNORECASE)
+_INTERPRETATION_END_RE = re.compile(r'\[INTERPRETATION_END\]', re.IGNORECASE)
+
+
+# Лимит Telegram на длину подписи к фото
+MAX_CAPTION_LENGTH = 1024
+
+# Лимит Telegram на длину текстового сообщения (можно уменьшить через max_message_length в config.json)
+DEFAULT_MAX_MESSAGE_LENGTH = 4096
+
+# Повторные попытки отправки финального сообщения. Таймауты запросов к Bot API
+# задаются один раз при создании Application (см. bot.py); отдельно увеличен только
+# таймаут записи для загрузки фото - у медиа-методов PTB он по умолчанию 20 секунд
+SEND_MAX_RETRIES = 3
+SEND_TIMEOUT = 60
+
+
+def _chain_partial_handlers(*handlers):
+    """
+    Объединяет обработчики частичного ответа LLM в один (None пропускаются)
+    
+    :param handlers: Корутины, принимающие накопленный текст ответа
+    :return: Корутина, вызывающая их по очереди
+    """
+    active = [handler for handler in handlers if handler is not None]
+    
+    async def on_partial(response: str):
+        for handler in active:
+            await handler(response)
+    
+    return on_partial
+
+
+class _SendRateLimiter:
+    """
+    Ограничитель частоты исходящих сообщений для всего бота (token bucket)
+    
+    Пока лимит не исчерпан, сообщения уходят без задержки; ждать приходится
+    только при всплеске отправок, а не фиксированную паузу перед каждой частью.
+    """
+    
+    def __init__(self, rate: int, period: float = 1.0):
+        """
+        :param rate: Количество сообщений за период
+        :param period: Период в секундах
+        """
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = None
+        self._lock = asyncio.Lock()
+    
+    async def __aenter__(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return self
+                await asyncio.sleep((1 - self._tokens) * self.period / self.rate)
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+# Лимит Telegram на исходящие сообщения бота - около 30 в секунду
+_send_limiter = _SendRateLimiter(30)
+
+
+class _StreamingPreview:
+    """
+    Черновик финальной интерпретации, обновляемый по мере стриминга ответа LLM
+    
+    Пользователь видит текст с первых фрагментов, не дожидаясь окончания генерации.
+    Когда текст перестаёт помещаться в одно сообщение, заполненная часть фиксируется
+    (по границе абзаца) и продолжение идёт в новом черновике. Черновики трекаются как
+    промежуточные сообщения и удаляются перед отправкой оформленного результата
+    (изображение расклада + полный текст).
+    """
+    
+    # Telegram ограничивает частоту редактирования одного сообщения
+    MIN_EDIT_INTERVAL = 1.5
+    MAX_LENGTH = 4000
+    
+    def __init__(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int):
+        """
+        :param context: Контекст бота
+        :param chat_id: ID чата пользователя
+        """
+        self.context = context
+        self.chat_id = chat_id
+        self.message = None
+        self.shown_text = ""
+        self.last_edit = 0.0
+        # Начало интерпретации в ответе (ответ только дописывается, позиция не меняется)
+        self.text_start = None
+        # Смещение в тексте интерпретации, с которого начинается текущий черновик
+        self.offset = 0
+    
+    def _extract_text(self, response: str) -> str:
+        """Выделяет из частичного ответа текст между маркерами интерпретации"""
+        if self.text_start is None:
+            start = _INTERPRETATION_START_RE.search(response)
+            if not start:
+                return ""
+            self.text_start = start.end()
+        text = response[self.text_start:]
+        end = _INTERPRETATION_END_RE.search(text)
+        if end:
+            text = text[:end.start()]
+        return text.strip()
+    
+    async def _show(self, text: str):
+        """Показывает текст в текущем черновике (создаёт его при необходимости)"""
+        if not text or text == self.shown_text:
+            return
+        
+        # Без parse_mode: во фрагменте может оказаться незакрытая Markdown-разметка
+        async with _send_limiter:
+            if self.message is None:
+                self.message = await self.context.bot.send_message(chat_id=self.chat_id, text=text)
+                add_message_to_delete(self.chat_id, self.message.message_id)
+            else:
+                await self.message.edit_text(text)
+        self.shown_text = text
+    
+    async def __call__(self, response: str):
+        """
+        Обновляет черновик накопленным текстом ответа
+        
+        :param response: Текст ответа LLM, полученный к этому моменту
+        """
+        text = self._extract_text(response)
+        if not text:
+            return
+        
+        loop = asyncio.get_running_loop()
+        if loop.time() - self.last_edit < self.MIN_EDIT_INTERVAL:
+            return
+        self.last_edit = loop.time()
+        
+        part = text[self.offset:]
+        while len(part) > self.MAX_LENGTH:
+            # Заполненный черновик дописываем до границы абзаца и начинаем следующий
+            cut = part.rfind('\n\n', 0, self.MAX_LENGTH)
+            if cut <= 0:
+                cut = self.MAX_LENGTH
+            await self._show(part[:cut].strip())
+            self.message = None
+            self.shown_text = ""
+            self.offset += cut
+            part = text[self.offset:]
+        
+        await self._show(part.strip())
+
 # Инициализируем глобальные объекты
 _prompt_manager = None
 _image_generator = None
 _tarot_deck = None
+# Агенты LLM по (модель, ключ API, max_tokens, temperature)
+_llm_agents: Dict[tuple, TarotLLMAgent] = {}
+
+
+def get_llm_agent(model_name: str, api_key: str, max_tokens: int, temperature: float,
+                  use_response_cache: bool = True) -> TarotLLMAgent:
+    """
+    Получает агента OpenRouter для модели и параметров генерации
+    
+    Агент не хранит состояние сессии - история диалога передаётся в каждый запрос
+    (MessageContext сессии), поэтому один экземпляр обслуживает все сессии
+    
+    :param model_name: Название модели OpenRouter
+    :param api_key: API ключ OpenRouter
+    :param max_tokens: Максимальное количество токенов в ответе
+    :param temperature: Температура генерации
+    :param use_response_cache: Отдавать повторы запросов из дискового кэша ответов
+    :return: Экземпляр TarotLLMAgent
+    """
+    key = (model_name, api_key, max_tokens, temperature, use_response_cache)
+    agent = _llm_agents.get(key)
+    if agent is None:
+        agent = TarotLLMAgent(
+            model_name=model_name,
+            api_key=api_key,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            use_response_cache=use_response_cache
+        )
+        _llm_agents[key] = agent
+    return agent
 
 def get_prompt_manager():
     """Получает глобальный экземпляр PromptManager"""
     global _prompt_manager
     if _prompt_manager is None:
+        # Импорт при первом обращении: модуль нужен только при создании расклада
+        from src.prompt_manager import PromptManager
         _prompt_manager = PromptManager(
             prompts_dir="prompts",
             tarot_cards_file="assets/tarot-cards-images-info-ru.json"
@@ -42,6 +264,8 @@ def get_image_generator():
     """Получает глобальный экземпляр ImageGenerator"""
     global _image_generator
     if _image_generator is None:
+        # Импорт при первом обращении: Pillow и кэш изображений не нужны до первого расклада
+        from src.image_generator import ImageGenerator
         _image_generator = ImageGenerator()
     return _image_generator
 
@@ -49,10 +273,80 @@ def get_tarot_deck():
     """Получает глобальный экземпляр TarotDeck"""
     global _tarot_deck
     if _tarot_deck is None:
+        # Импорт при первом обращении, как и у остальных глобальных объектов
+        from src.card_manager import TarotDeck
         _tarot_deck = TarotDeck()
     return _tarot_deck
 
 
+def warm_up_integration():
+    """
+    Создаёт глобальные объекты интеграции и загружает промпты с данными карт
+    
+    Вызывается при запуске бота, чтобы первый расклад не тратил время на импорт
+    модулей, разбор JSON карт и чтение промптов.
+    """
+    get_tarot_deck()
+    get_image_generator()
+    get_prompt_manager().preload()
+
+
+def _format_llm_question_messages(questions: List[str]) -> List[str]:
+    """
+    Готовит тексты уточняющих вопросов для отправки с parse_mode='Markdown'
+    
+    Выполняется один раз после генерации вопросов. Текст вопроса от LLM
+    экранируется, чтобы случайные символы разметки (_, *, `, [) не приводили
+    к ошибке разбора Markdown на стороне Telegram.
+    
+    :param questions: Вопросы, сгенерированные LLM
+    :return: Готовые тексты сообщений с заголовком "Вопрос N из M"
+    """
+    total = len(questions)
+    return [
+        f"**Вопрос {i} из {total}:**\n{escape_markdown(question)}"
+        for i, question in enumerate(questions, 1)
+    ]
+
+
+def handle_bot_errors(log_message: str, user_message: str):
+    """
+    Декоратор единой обработки ошибок для корутин-обработчиков вида (update, context, ...)
+    
+    Ошибка логируется, пользователь получает сообщение, а оставшийся прогресс-бар
+    из состояния отменяется, чтобы он не «зависал» в чате. asyncio.CancelledError
+    не является Exception и пробрасывается дальше без обработки.
+    
+    :param log_message: Начало сообщения для лога
+    :param user_message: Текст, отправляемый пользователю при ошибке
+    :return: Декоратор
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+            try:
+                return await handler(update, context, *args, **kwargs)
+            except Exception as e:
+                chat_id = update.effective_chat.id if update.effective_chat else None
+                logger.error(f"{log_message} для пользователя {chat_id}: {e}")
+                
+                progress_manager = get_user_data(chat_id).get('progress_manager') if chat_id else None
+                if progress_manager:
+                    try:
+                        await progress_manager.cancel()
+                    except Exception as cancel_error:
+                        logger.warning(f"Не удалось отменить прогресс-бар для пользователя {chat_id}: {cancel_error}")
+                
+                try:
+                    await update.effective_message.reply_text(user_message)
+                except Exception as send_error:
+                    logger.error(f"Не удалось уведомить пользователя {chat_id} об ошибке: {send_error}")
+        return wrapper
+    return decorator
+
+
+@handle_bot_errors("Ошибка при запуске LLM интерпретации",
+                   "❌ Произошла ошибка при анализе вашего расклада. Попробуйте позже.")
 async def start_llm_interpretation(update: Update, context: ContextTypes.DEFAULT_TYPE,
                                  chat_id: int, session_data: dict, tariff: str = "beginner") -> None:
     """
@@ -64,231 +358,269 @@ async def start_llm_interpretation(update: Update, context: ContextTypes.DEFAULT
     :param session_data: Данные сессии пользователя
     :param tariff: Выбранный тариф ("beginner" или "expert")
     """
-    try:
-        spread_type = session_data.get('spread_type')
-        magic_number = session_data.get('magic_number')
-        preliminary_answers = session_data.get('preliminary_answers', [])
-        
-        logger.info(f"Начинаем LLM интерпретацию для пользователя {chat_id}, расклад {spread_type}")
-        
-        # Создаем прогресс-бар СРАЗУ после ответов на предварительные вопросы
-        progress_bar = await create_progress_bar(update, context)
-        progress_manager = InterpretationProgress(progress_bar)
-        progress_manager.set_update_context(update, context)  # Сохраняем контекст для пересоздания
-        await progress_manager.start_preparation()  # 0% - Подготавливаю расклад...
-        
-        # Подготавливаем данные для LLM
-        user_data = {
-            'name': session_data.get('name'),
-            'age': session_data.get('age')
-        }
-        
-        # ОТКЛАДЫВАЕМ генерацию изображения до финальной стадии - только подготавливаем данные
-        
-        # Маппинг callback названий в конфигурационные названия
-        SPREAD_MAPPING = {
-            'spread_single': 'single_card',
-            'spread_three': 'three_cards', 
-            'spread_horseshoe': 'horseshoe',
-            'spread_love': 'love_triangle',
-            'spread_celtic': 'celtic_cross',
-            'spread_week': 'week_forecast',
-            'spread_year': 'year_wheel'
-        }
-        
-        # Подготавливаем данные для генерации карт (но не генерируем изображение)
-        mapped_spread_type = SPREAD_MAPPING.get(spread_type, spread_type)
-        
-        # Выбираем карты без создания изображения
-        from src.spread_configs import get_spread_config
-        spread_config = get_spread_config(mapped_spread_type)
-        if not spread_config:
-            await progress_bar.cancel()
-            await update.message.reply_text("❌ Ошибка конфигурации расклада. Попробуйте позже.")
-            return
-            
-        tarot_deck = get_tarot_deck()
-        selected_cards = select_cards(tarot_deck, spread_config['card_count'], magic_number, chat_id)
-        
-        # Сохраняем данные расклада (изображение создадим в финале)
-        update_data(chat_id, 'selected_cards', selected_cards)
-        update_data(chat_id, 'positions', spread_config['positions']) 
-        update_data(chat_id, 'spread_config', spread_config)  # Сохраняем конфигурацию для генерации позже
-        
-        # Создаем лог расклада
-        spread_logger = get_spread_logger()
-        from src.keyboards import SPREAD_NAMES
-        spread_name = SPREAD_NAMES.get(spread_type, "Неизвестный расклад")
+    spread_type = session_data.get('spread_type')
+    magic_number = session_data.get('magic_number')
+    preliminary_answers = session_data.get('preliminary_answers', [])
+    questions_obj = session_data.get('questions')
+    preliminary_questions = [q.text for q in questions_obj.questions] if questions_obj else []
+    
+    logger.info(f"Начинаем LLM интерпретацию для пользователя {chat_id}, расклад {spread_type}")
+    
+    # Создаем прогресс-бар СРАЗУ после ответов на предварительные вопросы
+    progress_bar = await create_progress_bar(update, context)
+    progress_manager = InterpretationProgress(progress_bar)
+    progress_manager.set_update_context(update, context)  # Сохраняем контекст для пересоздания
+    await progress_manager.start_preparation()  # 0% - Подготавливаю расклад...
+    
+    # Подготавливаем данные для LLM
+    user_data = {
+        'name': session_data.get('name'),
+        'age': session_data.get('age')
+    }
+    
+    # ОТКЛАДЫВАЕМ генерацию изображения до финальной стадии - только подготавливаем данные
+    
+    # Подготавливаем данные для генерации карт (но не генерируем изображение)
+    mapped_spread_type, spread_config = resolve_spread(spread_type)
+    if not spread_config:
+        await progress_bar.cancel()
+        await update.message.reply_text("❌ Ошибка конфигурации расклада. Попробуйте позже.")
+        return
         
-        log_filepath = spread_logger.create_spread_log(
-            chat_id=chat_id,
+    from src.card_manager import select_cards
+    tarot_deck = get_tarot_deck()
+    selected_cards = select_cards(tarot_deck, spread_config['card_count'], magic_number, chat_id)
+    
+    # Создаем лог расклада
+    spread_logger = get_spread_logger()
+    spread_name = SPREAD_NAMES.get(spread_type, "Неизвестный расклад")
+    
+    # Запись на диск идёт в потоке логгера - путь к файлу получаем оттуда
+    log_filepath = await asyncio.wrap_future(spread_logger.submit(
+        spread_logger.create_spread_log,
+        chat_id=chat_id,
+        user_data=user_data,
+        spread_type=spread_type,
+        spread_name=spread_name,
+        magic_number=magic_number,
+        selected_cards=selected_cards,
+        positions=spread_config['positions'],
+        telegram_username=session_data.get('telegram_username'),
+        telegram_first_name=session_data.get('telegram_first_name'),
+        telegram_last_name=session_data.get('telegram_last_name'),
+        user_id=session_data.get('user_id')
+    ))
+    
+    # Логируем предварительные вопросы и ответы
+    if questions_obj and preliminary_answers:
+        spread_logger.submit(spread_logger.update_preliminary_questions,
+                             log_filepath, preliminary_questions, preliminary_answers)
+    
+    # Подготавливаем данные расклада для LLM
+    spread_data = {
+        'spread_type': mapped_spread_type,
+        'cards': selected_cards,
+        'positions': spread_config['positions'],
+        'questions': preliminary_questions
+    }
+    
+    # Получаем модель для выбранного тарифа
+    config = load_config()
+    tariff_plans = config.get('tariff_plans', {})
+    tariff_info = tariff_plans.get(tariff, tariff_plans.get('beginner', {}))
+    model_name = tariff_info.get('model_name', 'deepseek/deepseek-chat-v3-0324:free')
+    
+    # Агент для выбранной модели (общий для всех сессий с теми же параметрами)
+    agent = get_llm_agent(
+        model_name=model_name,
+        api_key=config.get('openrouter_api_key'),
+        max_tokens=config.get('max_response_tokens', 8000),
+        temperature=config.get('temperature', 0.3),
+        use_response_cache=config.get('features', {}).get('response_cache_enabled', True)
+    )
+    
+    # Создаем LLM сессию с агентом и prompt manager
+    llm_session = LLMSession(agent, get_prompt_manager())
+    
+    # Сохраняем данные расклада (изображение создадим в финале по spread_config),
+    # путь к логу и LLM сессию одним обновлением
+    update_data_many(
+        chat_id,
+        selected_cards=selected_cards,
+        positions=spread_config['positions'],
+        spread_config=spread_config,
+        log_filepath=log_filepath,
+        llm_session=llm_session
+    )
+    
+    # Запускаем первую часть интерпретации
+    try:
+        questions, _ = await llm_session.run_full_interpretation(
             user_data=user_data,
-            spread_type=spread_type,
-            spread_name=spread_name,
-            magic_number=session_data.get('magic_number'),
-            selected_cards=selected_cards,
-            positions=spread_config['positions'],
-            telegram_username=session_data.get('telegram_username'),
-            telegram_first_name=session_data.get('telegram_first_name'),
-            telegram_last_name=session_data.get('telegram_last_name'),
-            user_id=session_data.get('user_id')
+            spread_data=spread_data,
+            preliminary_answers=preliminary_answers
         )
-        
-        # Сохраняем путь к логу для дальнейшего использования
-        update_data(chat_id, 'log_filepath', log_filepath)
-        
-        # Логируем предварительные вопросы и ответы
-        if session_data.get('questions') and session_data.get('preliminary_answers'):
-            preliminary_questions = [q.text for q in session_data.get('questions', {}).questions]
-            preliminary_answers = session_data.get('preliminary_answers', [])
-            spread_logger.update_preliminary_questions(log_filepath, preliminary_questions, preliminary_answers)
-        
-        # Подготавливаем данные расклада для LLM
-        spread_data = {
-            'spread_type': mapped_spread_type,
-            'cards': selected_cards,
-            'positions': spread_config['positions'],
-            'questions': [q.text for q in session_data.get('questions', {}).questions] if session_data.get('questions') else []
-        }
-        
-        # Получаем модель для выбранного тарифа
-        config = load_config()
-        tariff_plans = config.get('tariff_plans', {})
-        tariff_info = tariff_plans.get(tariff, tariff_plans.get('beginner', {}))
-        model_name = tariff_info.get('model_name', 'deepseek/deepseek-chat-v3-0324:free')
-        
-        # Создаем TarotLLMAgent с выбранной моделью
-        api_key = config.get('openrouter_api_key')
-        agent = TarotLLMAgent(
-            model_name=model_name,
-            api_key=api_key,
-            max_tokens=config.get('max_response_tokens', 8000),
-            temperature=config.get('temperature', 0.3)
+    except Exception as llm_error:
+        # Обработка ошибок OpenRouter API
+        await handle_llm_error(update, context, chat_id, llm_error)
+        return
+    
+    if questions:
+        # LLM сгенерировал уточняющие вопросы
+        question_messages = _format_llm_question_messages(questions)
+        update_data_many(
+            chat_id,
+            llm_questions=questions,
+            llm_question_messages=question_messages,
+            current_llm_question=0,
+            llm_answers=[],
+            progress_manager=progress_manager  # Сохраняем для продолжения
         )
         
-        # Создаем LLM сессию с агентом и prompt manager
-        llm_session = LLMSession(agent, get_prompt_manager())
-        update_data(chat_id, 'llm_session', llm_session)
+        # Обновляем прогресс до 25% после генерации вопросов
+        await progress_manager.complete_llm_questions_generation()  # 25%
         
-        # Запускаем первую часть интерпретации
-        try:
-            questions, _ = await llm_session.run_full_interpretation(
-                user_data=user_data,
-                spread_data=spread_data,
-                preliminary_answers=preliminary_answers
-            )
-        except Exception as llm_error:
-            # Обработка ошибок OpenRouter API
-            await handle_llm_error(update, context, chat_id, llm_error)
-            return
+        set_state(chat_id, UserState.WAITING_LLM_QUESTIONS)
         
-        if questions:
-            # LLM сгенерировал уточняющие вопросы
-            update_data(chat_id, 'llm_questions', questions)
-            update_data(chat_id, 'current_llm_question', 0)
-            update_data(chat_id, 'llm_answers', [])
-            update_data(chat_id, 'progress_manager', progress_manager)  # Сохраняем для продолжения
-            
-            # Обновляем прогресс до 25% после генерации вопросов
-            await progress_manager.complete_llm_questions_generation()  # 25%
-            
-            set_state(chat_id, UserState.WAITING_LLM_QUESTIONS)
-            
-            await update.message.reply_text(
-                f"❓ У меня есть несколько уточняющих вопросов для более точной интерпретации:\n\n"
-                f"**Вопрос 1 из {len(questions)}:**\n"
-                f"{questions[0]}",
-                parse_mode='Markdown'
-            )
-            
-            logger.info(f"LLM сгенерировал {len(questions)} уточняющих вопросов для пользователя {chat_id}")
-        else:
-            # Нет дополнительных вопросов - продолжаем с тем же прогресс-баром
-            update_data(chat_id, 'progress_manager', progress_manager)
-            await progress_manager.complete_llm_questions_generation()  # 25%
-            
-            # Получаем обновленные данные сессии с LLM объектом
-            updated_session_data = get_user_data(chat_id)
-            await continue_final_interpretation(update, context, chat_id, updated_session_data)
-            
-    except Exception as e:
-        logger.error(f"Ошибка при запуске LLM интерпретации для пользователя {chat_id}: {e}")
         await update.message.reply_text(
-            "❌ Произошла ошибка при анализе вашего расклада. Попробуйте позже."
+            f"❓ У меня есть несколько уточняющих вопросов для более точной интерпретации:\n\n"
+            f"{question_messages[0]}",
+            parse_mode='Markdown'
         )
+        
+        logger.info(f"LLM сгенерировал {len(questions)} уточняющих вопросов для пользователя {chat_id}")
+    else:
+        # Нет дополнительных вопросов - продолжаем с тем же прогресс-баром
+        update_data(chat_id, 'progress_manager', progress_manager)
+        await progress_manager.complete_llm_questions_generation()  # 25%
+        
+        # Данные сессии с LLM объектом собираем из уже имеющихся значений,
+        # без повторного копирования всего состояния пользователя
+        updated_session_data = {
+            **session_data,
+            'selected_cards': selected_cards,
+            'positions': spread_config['positions'],
+            'spread_config': spread_config,
+            'log_filepath': log_filepath,
+            'llm_session': llm_session,
+            'progress_manager': progress_manager
+        }
+        await continue_final_interpretation(update, context, chat_id, updated_session_data)
 
 
+@handle_bot_errors("Ошибка при обработке LLM вопросов",
+                   "❌ Ошибка при обработке ответа. Попробуйте еще раз:")
 async def process_llm_questions(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает ответы на уточняющие вопросы от LLM"""
-    try:
-        chat_id = update.effective_chat.id
-        user_input = update.message.text.strip()
-        session_data = get_user_data(chat_id)
-        
-        llm_questions = session_data.get('llm_questions', [])
-        current_question = session_data.get('current_llm_question', 0)
-        llm_answers = session_data.get('llm_answers', [])
+    chat_id = update.effective_chat.id
+    user_input = update.message.text.strip()
+    session_data = get_user_data(chat_id)
+    
+    llm_questions = session_data.get('llm_questions', [])
+    question_messages = session_data.get('llm_question_messages') or _format_llm_question_messages(llm_questions)
+    current_question = session_data.get('current_llm_question', 0)
+    llm_answers = session_data.get('llm_answers', [])
+    
+    # Сохраняем ответ
+    llm_answers.append(user_input)
+    
+    # Проверяем, есть ли еще вопросы
+    if current_question + 1 < len(llm_questions):
+        # Переходим к следующему вопросу - ответ и номер вопроса сохраняем одним обновлением
+        next_question = current_question + 1
+        update_data_many(chat_id, llm_answers=llm_answers, current_llm_question=next_question)
         
-        # Сохраняем ответ
-        llm_answers.append(user_input)
+        await update.message.reply_text(
+            f"✅ Спасибо за ответ!\n\n"
+            f"{question_messages[next_question]}",
+            parse_mode='Markdown'
+        )
+    else:
+        # Все вопросы отвечены - переходим к финальной интерпретации
         update_data(chat_id, 'llm_answers', llm_answers)
-        
-        # Проверяем, есть ли еще вопросы
-        if current_question + 1 < len(llm_questions):
-            # Переходим к следующему вопросу
-            next_question = current_question + 1
-            update_data(chat_id, 'current_llm_question', next_question)
-            
-            await update.message.reply_text(
-                f"✅ Спасибо за ответ!\n\n"
-                f"**Вопрос {next_question + 1} из {len(llm_questions)}:**\n"
-                f"{llm_questions[next_question]}",
-                parse_mode='Markdown'
-            )
-        else:
-            # Все вопросы отвечены - переходим к финальной интерпретации
-            await continue_final_interpretation(update, context, chat_id, session_data)
-            
-    except Exception as e:
-        logger.error(f"Ошибка при обработке LLM вопросов для пользователя {chat_id}: {e}")
-        await update.message.reply_text("❌ Ошибка при обработке ответа. Попробуйте еще раз:")
+        await continue_final_interpretation(update, context, chat_id, session_data)
 
 
+def _start_spread_image_task(session_data: dict) -> Optional[asyncio.Task]:
+    """
+    Запускает генерацию изображения расклада в фоне (в отдельном потоке)
+    
+    :param session_data: Данные сессии пользователя (spread_config и selected_cards)
+    :return: Задача, возвращающая байты изображения, или None если данных расклада нет
+    """
+    spread_config = session_data.get('spread_config')
+    selected_cards = session_data.get('selected_cards')
+    if not spread_config or not selected_cards:
+        return None
+    
+    image_generator = get_image_generator()
+    return asyncio.create_task(asyncio.to_thread(
+        image_generator.generate_spread_image,
+        background_id=spread_config['background_id'],
+        cards=selected_cards,
+        positions=spread_config['positions'],
+        scale=spread_config['scale']
+    ))
+
+
+def _discard_spread_image_task(image_task: Optional[asyncio.Task]) -> None:
+    """
+    Завершает работу с фоновой задачей изображения, если оно не понадобилось
+    
+    Незавершённая задача отменяется, а ошибка завершённой забирается, чтобы
+    asyncio не сообщал о необработанном исключении.
+    
+    :param image_task: Задача из _start_spread_image_task или None
+    """
+    if image_task is None:
+        return
+    if not image_task.done():
+        image_task.cancel()
+    elif not image_task.cancelled() and image_task.exception() is not None:
+        logger.debug(f"Фоновая генерация изображения завершилась ошибкой: {image_task.exception()}")
+
+
+@handle_bot_errors("Ошибка при генерации финальной интерпретации",
+                   "❌ Ошибка при генерации интерпретации.")
 async def continue_final_interpretation(update: Update, context: ContextTypes.DEFAULT_TYPE,
                                        chat_id: int, session_data: dict) -> None:
     """Продолжает финальную генерацию интерпретации с существующим прогресс-баром"""
+    set_state(chat_id, UserState.PROCESSING_INTERPRETATION)
+    
+    llm_session = session_data.get('llm_session')
+    llm_answers = session_data.get('llm_answers', [])
+    log_filepath = session_data.get('log_filepath')
+    progress_manager = session_data.get('progress_manager')
+    
+    if not llm_session:
+        raise ValueError("LLM сессия не найдена")
+    
+    if not progress_manager:
+        # Создаем новый прогресс-бар если его нет
+        progress_bar = await create_progress_bar(update, context)
+        progress_manager = InterpretationProgress(progress_bar)
+        await progress_manager.complete_llm_questions_generation()  # 25%
+    
+    # Изображение расклада рисуется в отдельном потоке параллельно с запросами к LLM
+    # и к моменту отправки обычно уже готово
+    image_task = _start_spread_image_task(session_data)
+    
     try:
-        set_state(chat_id, UserState.PROCESSING_INTERPRETATION)
-        
-        llm_session = session_data.get('llm_session')
-        llm_answers = session_data.get('llm_answers', [])
-        log_filepath = session_data.get('log_filepath')
-        progress_manager = session_data.get('progress_manager')
-        
-        if not llm_session:
-            raise ValueError("LLM сессия не найдена")
-        
-        if not progress_manager:
-            # Создаем новый прогресс-бар если его нет
-            progress_bar = await create_progress_bar(update, context)
-            progress_manager = InterpretationProgress(progress_bar)
-            await progress_manager.complete_llm_questions_generation()  # 25%
-        
         # Запускаем генерацию с прогресс-баром
         try:
             interpretation = await generate_interpretation_with_visual_progress(
                 llm_session, llm_answers, progress_manager, log_filepath
             )
-            
+        
             # Завершаем прогресс-бар
             await progress_manager.finish()
-            
+        
         except Exception as llm_error:
             # Логируем ошибку
             if log_filepath:
                 spread_logger = get_spread_logger()
-                spread_logger.log_llm_error(log_filepath, str(llm_error), "final_interpretation")
-            
+                spread_logger.submit(spread_logger.log_llm_error, log_filepath, str(llm_error), "final_interpretation")
+        
             # Отменяем прогресс-бар при ошибке
             await progress_manager.cancel()
             await handle_llm_error(update, context, chat_id, llm_error)
@@ -296,15 +628,19 @@ async def continue_final_interpretation(update: Update, context: ContextTypes.DE
         
         if interpretation:
             # Отправляем финальную интерпретацию С ИЗОБРАЖЕНИЕМ
-            await send_final_interpretation_with_image(update, context, chat_id, interpretation, session_data)
+            await send_final_interpretation_with_image(update, context, chat_id, interpretation, session_data,
+                                                      image_task=image_task)
         else:
             await update.message.reply_text(
                 "❌ Не удалось сгенерировать интерпретацию. Попробуйте позже."
             )
-            
-    except Exception as e:
-        logger.error(f"Ошибка при генерации финальной интерпретации для пользователя {chat_id}: {e}")
-        await update.message.reply_text("❌ Ошибка при генерации интерпретации.")
+        
+        # Сессия LLM (с полной историей диалога) и прогресс-бар больше не нужны:
+        # не держим их в памяти, пока пользователь оставляет отзыв.
+        # Изображение расклада в сессии не хранится - оно живёт только в задаче image_task
+        remove_data(chat_id, 'llm_session', 'progress_manager')
+    finally:
+        _discard_spread_image_task(image_task)
 
 
 async def generate_interpretation_with_visual_progress(llm_session: LLMSession, 
@@ -316,7 +652,7 @@ async def generate_interpretation_with_visual_progress(llm_session: LLMSession,
         # Логируем начало LLM обработки
         if log_filepath:
             spread_logger = get_spread_logger()
-            spread_logger.start_llm_processing(log_filepath, llm_session.agent.model_name)
+            spread_logger.submit(spread_logger.start_llm_processing, log_filepath, llm_session.agent.model_name)
         
         # Пересоздаем прогресс-бар после завершения всех вопросов для лучшей видимости
         recreated = await progress_manager.recreate_progress_bar(25)
@@ -325,29 +661,79 @@ async def generate_interpretation_with_visual_progress(llm_session: LLMSession,
         
         logger.info("🚀 Начинаем МНОГОЭТАПНУЮ интерпретацию...")
         
-        # Этап 2: 25% → 50% - Анализ контекста (промпт 04) - ОТДЕЛЬНЫЙ запрос
-        await progress_manager.start_context_analysis()
-        logger.info("=== Этап 2: Анализ контекста ===")
-        
-        await llm_session.stage_2_context_analysis(llm_answers)
-        
-        await progress_manager.complete_context_analysis()
-        
-        # Этап 3: 50% → 75% - Глубокий синтез (промпт 05) - ОТДЕЛЬНЫЙ запрос
-        await progress_manager.start_synthesis()
-        logger.info("=== Этап 3: Глубокий синтез ===")
-        
-        await llm_session.stage_3_deep_synthesis()
-        
-        await progress_manager.complete_synthesis()
-        
-        # Этап 4: 75% → 100% - Финальная интерпретация (промпт 06) - ОТДЕЛЬНЫЙ запрос
-        await progress_manager.start_final_interpretation()
-        logger.info("=== Этап 4: Финальная интерпретация ===")
+        # Ответы этапов получаем стримингом: прогресс-бар движется по мере генерации текста,
+        # а черновик финальной интерпретации показывается пользователю сразу
+        preview = None
+        if progress_manager.update_context:
+            update, context = progress_manager.update_context
+            preview = _StreamingPreview(context, update.effective_chat.id)
         
-        interpretation = await llm_session.stage_4_final_response()
+        # Этапы 2-4 идут строго по цепочке: каждый запрос продолжает общий контекст диалога.
+        # Параллельно с запросом к LLM выполняется только анимация прогресс-бара этапа,
+        # поэтому её задержки и запросы к Telegram не добавляются ко времени ожидания.
+        # Каждый этап - отдельный запрос: (название, анимация, запрос к LLM, завершение).
+        # Флаг features.single_request_interpretation выполняет этапы 2-4 одним запросом,
+        # флаг features.combine_analysis_stages объединяет в один запрос этапы 2 и 3
+        features = load_config().get('features', {})
+        if features.get('single_request_interpretation', False):
+            stages = (
+                # 25% → 100% - Анализ, синтез и финальная интерпретация одним запросом (промпты 04-06)
+                ("Этапы 2-4: Анализ, синтез и финальная интерпретация",
+                 progress_manager.start_context_analysis,
+                 lambda: llm_session.stage_2_4_single_request(
+                     llm_answers,
+                     on_partial=_chain_partial_handlers(progress_manager.stream_reporter(35, 100), preview)),
+                 progress_manager.complete_single_request),
+            )
+        else:
+            if features.get('combine_analysis_stages', False):
+                # 25% → 75% - Анализ контекста и синтез одним запросом (промпты 04 и 05)
+                analysis_stages = (
+                    ("Этапы 2-3: Анализ контекста и синтез",
+                     progress_manager.start_context_analysis,
+                     lambda: llm_session.stage_2_3_combined(
+                         llm_answers, on_partial=progress_manager.stream_reporter(35, 75)),
+                     progress_manager.complete_combined_analysis),
+                )
+            else:
+                analysis_stages = (
+                    # 25% → 50% - Анализ контекста (промпт 04)
+                    ("Этап 2: Анализ контекста",
+                     progress_manager.start_context_analysis,
+                     lambda: llm_session.stage_2_context_analysis(
+                         llm_answers, on_partial=progress_manager.stream_reporter(35, 50)),
+                     progress_manager.complete_context_analysis),
+                    # 50% → 75% - Глубокий синтез (промпт 05)
+                    ("Этап 3: Глубокий синтез",
+                     progress_manager.start_synthesis,
+                     lambda: llm_session.stage_3_deep_synthesis(
+                         on_partial=progress_manager.stream_reporter(60, 75)),
+                     progress_manager.complete_synthesis),
+                )
+            
+            stages = (
+                *analysis_stages,
+                # 75% → 100% - Финальная интерпретация (промпт 06)
+                ("Этап 4: Финальная интерпретация",
+                 progress_manager.start_final_interpretation,
+                 lambda: llm_session.stage_4_final_response(
+                     on_partial=_chain_partial_handlers(progress_manager.stream_reporter(85, 100), preview)),
+                 progress_manager.complete_final_interpretation),
+            )
         
-        await progress_manager.complete_final_interpretation()
+        interpretation = None
+        for title, start_stage, run_stage, complete_stage in stages:
+            logger.info(f"=== {title} ===")
+            animation = asyncio.create_task(start_stage())
+            try:
+                interpretation = await run_stage()
+                await animation
+            finally:
+                # При ошибке этапа анимация не должна продолжать править прогресс-бар
+                if not animation.done():
+                    animation.cancel()
+                    await asyncio.gather(animation, return_exceptions=True)
+            await complete_stage()
         
         logger.info("🎯 МНОГОЭТАПНАЯ интерпретация успешно завершена!")
         return interpretation
@@ -357,6 +743,20 @@ async def generate_interpretation_with_visual_progress(llm_session: LLMSession,
         return None
 
 
+# Максимум сообщений в одном запросе deleteMessages Bot API
+DELETE_MESSAGES_BATCH = 100
+
+
+async def _delete_message_safe(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int) -> None:
+    """Удаляет одно сообщение, пропуская уже удалённые или недоступные"""
+    try:
+        async with _send_limiter:
+            await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        # Сообщение уже могло быть удалено или недоступно
+        logger.warning(f"Не удалось удалить сообщение {message_id}: {e}")
+
+
 async def cleanup_chat_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
     """Удаляет все промежуточные сообщения из чата"""
     try:
@@ -364,13 +764,19 @@ async def cleanup_chat_messages(update: Update, context: ContextTypes.DEFAULT_TY
         if messages_to_delete:
             logger.info(f"Удаляем {len(messages_to_delete)} промежуточных сообщений для чата {chat_id}")
             
-            for message_id in messages_to_delete:
+            # Пачка сообщений удаляется одним запросом deleteMessages (недоступные Telegram пропускает).
+            # Если пачку удалить не удалось, удаляем её сообщения по одному - параллельно,
+            # частоту запросов ограничивает общий лимитер бота
+            for start in range(0, len(messages_to_delete), DELETE_MESSAGES_BATCH):
+                batch = messages_to_delete[start:start + DELETE_MESSAGES_BATCH]
                 try:
-                    await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-                    await asyncio.sleep(0.1)  # Небольшая задержка между удалениями
+                    async with _send_limiter:
+                        await context.bot.delete_messages(chat_id=chat_id, message_ids=batch)
                 except Exception as e:
-                    # Сообщение уже могло быть удалено или недоступно
-                    logger.warning(f"Не удалось удалить сообщение {message_id}: {e}")
+                    logger.warning(f"Не удалось удалить пачку сообщений, удаляем по одному: {e}")
+                    await asyncio.gather(*(
+                        _delete_message_safe(context, chat_id, message_id) for message_id in batch
+                    ))
             
             # Очищаем список после удаления
             clear_messages_to_delete(chat_id)
@@ -379,140 +785,149 @@ async def cleanup_chat_messages(update: Update, context: ContextTypes.DEFAULT_TY
         logger.error(f"Ошибка при очистке чата: {e}")
 
 
+def get_max_message_length() -> int:
+    """
+    Максимальная длина одной части текстового сообщения
+    
+    load_config кэширует конфигурацию и перечитывает файл только после его изменения
+    
+    :return: Лимит длины сообщения
+    """
+    return load_config().get("max_message_length", DEFAULT_MAX_MESSAGE_LENGTH)
+
+
+def _format_cards_list(selected_cards: List[Dict]) -> str:
+    """
+    Формирует нумерованный список выпавших карт (каждая строка заканчивается переводом строки)
+    
+    :param selected_cards: Выбранные карты
+    :return: Текст списка
+    """
+    return "".join(f"{i}. {card['name']}\n" for i, card in enumerate(selected_cards, 1))
+
+
+async def _finish_interpretation(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                 chat_id: int, interpretation: str, session_data: dict) -> None:
+    """
+    Общее завершение расклада после отправки интерпретации: лог расклада,
+    запрос обратной связи и время последнего расклада
+    
+    :param session_data: Данные сессии (log_filepath, llm_questions, llm_answers)
+    """
+    log_filepath = session_data.get('log_filepath')
+    if log_filepath:
+        spread_logger = get_spread_logger()
+        spread_logger.submit(spread_logger.complete_interpretation, log_filepath, interpretation)
+        
+        # Логируем LLM вопросы и ответы если есть
+        llm_questions = session_data.get('llm_questions', [])
+        if llm_questions:
+            spread_logger.submit(spread_logger.update_llm_questions,
+                                 log_filepath, llm_questions, session_data.get('llm_answers', []))
+    
+    # Модули нужны только после отправки результата - импортируем их здесь
+    from src.feedback_system import get_feedback_system
+    from src.user_manager import update_last_spread
+    
+    # Запрашиваем обратную связь через систему обратной связи
+    await get_feedback_system().request_feedback(update, context, chat_id)
+    
+    # Обновляем время последнего расклада
+    update_last_spread(chat_id)
+
+
 async def send_final_interpretation_with_image(update: Update, context: ContextTypes.DEFAULT_TYPE,
-                                              chat_id: int, interpretation: str, session_data: dict) -> None:
-    """Отправляет финальное сообщение с изображением и интерпретацией"""
+                                              chat_id: int, interpretation: str, session_data: dict,
+                                              image_task: Optional[asyncio.Task] = None) -> None:
+    """
+    Отправляет финальное сообщение с изображением и интерпретацией
+    
+    :param image_task: Фоновая задача генерации изображения (см. _start_spread_image_task).
+                       Если не передана, изображение генерируется здесь
+    """
+    # Промежуточные сообщения удаляются параллельно с ожиданием изображения и отправкой:
+    # финальные сообщения в список на удаление не попадают, ждать очистку перед ними не нужно
+    cleanup_task = asyncio.create_task(cleanup_chat_messages(update, context, chat_id))
     try:
-        # СНАЧАЛА ОЧИЩАЕМ ЧАТ ОТ ПРОМЕЖУТОЧНЫХ СООБЩЕНИЙ
-        await cleanup_chat_messages(update, context, chat_id)
-        # ГЕНЕРИРУЕМ ИЗОБРАЖЕНИЕ ТОЛЬКО СЕЙЧАС!
-        spread_config = session_data.get('spread_config')
         selected_cards = session_data.get('selected_cards', [])
         
-        if spread_config and selected_cards:
-            # Генерируем изображение в финале
-            image_generator = get_image_generator()
-            image_bytes = image_generator.generate_spread_image(
-                background_id=spread_config['background_id'],
-                cards=selected_cards,
-                positions=spread_config['positions'], 
-                scale=spread_config['scale']
-            )
-        else:
-            image_bytes = None
+        if image_task is None:
+            image_task = _start_spread_image_task(session_data)
+        image_bytes = await image_task if image_task is not None else None
         
         # Создаём описание карт
-        cards_description = "🎴 Выпавшие карты:\n"
-        for i, card in enumerate(selected_cards, 1):
-            cards_description += f"{i}. {card['name']}\n"
+        cards_description = "🎴 Выпавшие карты:\n" + _format_cards_list(selected_cards)
             
-        # Обрезаем длинную интерпретацию для caption
-        config = load_config()
-        max_caption_length = 1024  # Telegram limit for captions
-        
         # Формат финального сообщения (убираем лишнюю строку "Интерпретация:")
         full_message = f"🎴 {cards_description}\n{interpretation}"
         
-        # Отправляем сообщения с увеличенным таймаутом и повторными попытками
-        from telegram.constants import ParseMode
-        from telegram.error import TimedOut, NetworkError
-        
-        MAX_RETRIES = 3
-        TIMEOUT = 60  # 60 секунд вместо стандартных 20
+        # Заранее собираем список отправок: ('photo', подпись) или ('text', текст)
+        # Текст делится на части только если не помещается в одно сообщение
+        send_ops: List[Tuple[str, str]] = []
+        max_text_length = get_max_message_length()
+        if image_bytes:
+            if len(full_message) <= MAX_CAPTION_LENGTH:
+                # Отправляем всё одним сообщением
+                send_ops.append(('photo', full_message))
+            else:
+                # Изображение с кратким caption, интерпретация - отдельным сообщением (или частями)
+                send_ops.append(('photo', cards_description))
+                send_ops.extend(('text', part) for part in split_long_message(interpretation, max_text_length))
+        else:
+            # Нет изображения - отправляем только текст
+            send_ops.extend(('text', part) for part in split_long_message(full_message, max_text_length))
         
-        for attempt in range(MAX_RETRIES):
+        # Части отправляются последовательно (порядок важен), без фиксированных пауз:
+        # частоту ограничивает общий лимитер бота. При ошибке повторяется только
+        # неотправленная часть - уже доставленные фото и тексты не дублируются
+        op_index = 0
+        attempt = 0
+        while op_index < len(send_ops):
+            kind, text = send_ops[op_index]
             try:
-                if image_bytes:
-                    if len(full_message) <= max_caption_length:
-                        # Отправляем всё одним сообщением
-                        await asyncio.wait_for(
-                            update.message.reply_photo(
-                                photo=image_bytes,
-                                caption=full_message
-                            ),
-                            timeout=TIMEOUT
+                async with _send_limiter:
+                    if kind == 'photo':
+                        await update.message.reply_photo(
+                            photo=image_bytes,
+                            caption=text,
+                            write_timeout=SEND_TIMEOUT
                         )
                     else:
-                        # Отправляем изображение с кратким caption
-                        await asyncio.wait_for(
-                            update.message.reply_photo(
-                                photo=image_bytes,
-                                caption=cards_description
-                            ),
-                            timeout=TIMEOUT
-                        )
-                        await asyncio.sleep(0.3)
-                        
-                        # Отправляем интерпретацию отдельным сообщением
-                        max_text_length = config.get("max_message_length", 4096)
-                        interpretation_text = interpretation
-                        
-                        if len(interpretation_text) <= max_text_length:
-                            await asyncio.wait_for(
-                                update.message.reply_text(
-                                    interpretation_text
-                                ),
-                                timeout=TIMEOUT
-                            )
-                        else:
-                            # Разбиваем на части
-                            parts = split_long_message(interpretation_text, max_text_length)
-                            for i, part in enumerate(parts):
-                                await asyncio.wait_for(
-                                    update.message.reply_text(
-                                        part
-                                    ),
-                                    timeout=TIMEOUT
-                                )
-                                if i < len(parts) - 1:
-                                    await asyncio.sleep(0.5)
-                else:
-                    # Нет изображения - отправляем только текст
-                    await asyncio.wait_for(
-                        update.message.reply_text(
-                            full_message
-                        ),
-                        timeout=TIMEOUT
-                    )
-                
-                # Если дошли сюда - отправка успешна
-                break
+                        await update.message.reply_text(text)
+                op_index += 1
+                attempt = 0
                 
-            except (TimedOut, NetworkError, asyncio.TimeoutError) as e:
-                if attempt < MAX_RETRIES - 1:
-                    logger.warning(f"Попытка {attempt + 1} отправить сообщение пользователю {chat_id} не удалась: {e}. Повторяем...")
-                    await asyncio.sleep(2 ** attempt)  # Экспоненциальная задержка
+            except RetryAfter as e:
+                # Telegram сам сообщает, сколько подождать - ждём ровно столько
+                attempt += 1
+                if attempt < SEND_MAX_RETRIES:
+                    retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                    logger.warning(f"Превышен лимит Telegram для пользователя {chat_id}, ждём {retry_after} с")
+                    await asyncio.sleep(retry_after)
                     continue
-                else:
-                    logger.error(f"Все попытки отправить сообщение пользователю {chat_id} исчерпаны: {e}")
-                    # Отправляем упрощенное уведомление
-                    try:
-                        await update.message.reply_text(
-                            "⚠️ Интерпретация готова, но произошла ошибка при отправке изображения. "
-                            "Попробуйте создать новый расклад."
-                        )
-                    except:
-                        pass
-                    return
-            
-        # Логируем завершение интерпретации
-        log_filepath = session_data.get('log_filepath')
-        if log_filepath:
-            spread_logger = get_spread_logger()
-            spread_logger.complete_interpretation(log_filepath, interpretation)
+                logger.error(f"Все попытки отправить сообщение пользователю {chat_id} исчерпаны: {e}")
+                return
+            except (TimedOut, NetworkError) as e:
+                attempt += 1
+                if attempt < SEND_MAX_RETRIES:
+                    logger.warning(f"Попытка {attempt} отправить часть {op_index + 1}/{len(send_ops)} "
+                                   f"пользователю {chat_id} не удалась: {e}. Повторяем...")
+                    await asyncio.sleep(2 ** (attempt - 1))  # Экспоненциальная задержка
+                    continue
+                logger.error(f"Все попытки отправить сообщение пользователю {chat_id} исчерпаны: {e}")
+                # Отправляем упрощенное уведомление
+                try:
+                    await update.message.reply_text(
+                        "⚠️ Интерпретация готова, но произошла ошибка при отправке изображения. "
+                        "Попробуйте создать новый расклад."
+                    )
+                except:
+                    pass
+                return
             
-            # Логируем LLM вопросы и ответы если есть
-            llm_questions = session_data.get('llm_questions', [])
-            llm_answers = session_data.get('llm_answers', [])
-            if llm_questions:
-                spread_logger.update_llm_questions(log_filepath, llm_questions, llm_answers)
-        
-        # Запрашиваем обратную связь через систему обратной связи
-        feedback_system = get_feedback_system()
-        await feedback_system.request_feedback(update, context, chat_id)
-        
-        # Обновляем время последнего расклада
-        update_last_spread(chat_id)
+        # Отзыв запрашиваем, когда промежуточные сообщения уже удалены
+        await cleanup_task
+        await _finish_interpretation(update, context, chat_id, interpretation, session_data)
         
         logger.info(f"Интерпретация с изображением отправлена пользователю {chat_id}")
         
@@ -525,48 +940,23 @@ async def send_final_interpretation_with_image(update: Update, context: ContextT
             )
         except:
             pass
+    finally:
+        # Очистка сама перехватывает свои ошибки; дожидаемся её и при досрочном выходе
+        await cleanup_task
 
 
 async def send_final_interpretation(update: Update, context: ContextTypes.DEFAULT_TYPE,
                                   chat_id: int, interpretation: str) -> None:
     """Отправляет финальную интерпретацию и запрашивает обратную связь"""
     try:
-        # Разбиваем длинное сообщение если нужно
-        config = load_config()
-        max_length = config.get("max_message_length", 4096)
-        
-        if len(interpretation) > max_length:
-            # Разбиваем на части
-            parts = split_long_message(interpretation, max_length)
-            for i, part in enumerate(parts):
-                if i == 0:
-                    await update.message.reply_text(f"🔮 **ВАША ИНТЕРПРЕТАЦИЯ:**\n\n{part}", parse_mode='Markdown')
-                else:
-                    await update.message.reply_text(part, parse_mode='Markdown')
-                await asyncio.sleep(0.5)  # Небольшая пауза между сообщениями
-        else:
-            await update.message.reply_text(f"🔮 **ВАША ИНТЕРПРЕТАЦИЯ:**\n\n{interpretation}", parse_mode='Markdown')
+        # Заголовок делится вместе с текстом, чтобы первая часть тоже укладывалась в лимит.
+        # Пауз между частями нет - частоту отправки ограничивает общий лимитер бота
+        message = f"🔮 **ВАША ИНТЕРПРЕТАЦИЯ:**\n\n{interpretation}"
+        for part in split_long_message(message, get_max_message_length()):
+            async with _send_limiter:
+                await update.message.reply_text(part, parse_mode='Markdown')
         
-        # Логируем завершение интерпретации
-        session_data = get_user_data(chat_id)
-        log_filepath = session_data.get('log_filepath')
-        
-        if log_filepath:
-            spread_logger = get_spread_logger()
-            spread_logger.complete_interpretation(log_filepath, interpretation)
-            
-            # Логируем LLM вопросы и ответы если есть
-            llm_questions = session_data.get('llm_questions', [])
-            llm_answers = session_data.get('llm_answers', [])
-            if llm_questions:
-                spread_logger.update_llm_questions(log_filepath, llm_questions, llm_answers)
-        
-        # Запрашиваем обратную связь через систему обратной связи
-        feedback_system = get_feedback_system()
-        await feedback_system.request_feedback(update, context, chat_id)
-        
-        # Обновляем время последнего расклада
-        update_last_spread(chat_id)
+        await _finish_interpretation(update, context, chat_id, interpretation, get_user_data(chat_id))
         
         logger.info(f"Интерпретация отправлена пользователю {chat_id}")
         
@@ -577,34 +967,22 @@ async def send_final_interpretation(update: Update, context: ContextTypes.DEFAUL
 async def generate_spread_image(spread_type: str, magic_number: int, chat_id: int) -> Optional[tuple]:
     """Генерирует изображение расклада"""
     try:
-        # Маппинг от callback_data к конфигурациям
-        SPREAD_MAPPING = {
-            'spread_single': 'single_card',
-            'spread_three': 'three_cards', 
-            'spread_horseshoe': 'horseshoe',
-            'spread_love': 'love_triangle',
-            'spread_celtic': 'celtic_cross',
-            'spread_week': 'week_forecast',
-            'spread_year': 'year_wheel'
-        }
-        
-        # Конвертируем ключ расклада
-        config_key = SPREAD_MAPPING.get(spread_type, spread_type)
-        
-        # Получаем конфигурацию расклада
-        spread_config = get_spread_config(config_key)
+        # Получаем название и конфигурацию расклада по callback_data
+        config_key, spread_config = resolve_spread(spread_type)
         if not spread_config:
             logger.error(f"Конфигурация расклада {config_key} (callback: {spread_type}) не найдена")
             return None
             
         # Выбираем карты
+        from src.card_manager import select_cards
         tarot_deck = get_tarot_deck()
         selected_cards = select_cards(tarot_deck, spread_config['card_count'], magic_number, chat_id)
         
         # Генерируем изображение
         image_generator = get_image_generator()
         
-        image_bytes = image_generator.generate_spread_image(
+        image_bytes = await asyncio.to_thread(
+            image_generator.generate_spread_image,
             background_id=spread_config['background_id'],
             cards=selected_cards,
             positions=spread_config['positions'], 
@@ -624,9 +1002,7 @@ async def send_spread_image(update: Update, context: ContextTypes.DEFAULT_TYPE,
     """Отправляет изображение расклада пользователю (устаревшая)"""
     try:
         # Создаем описание карт
-        cards_description = "🎴 **Выпавшие карты:**\n"
-        for i, card in enumerate(selected_cards, 1):
-            cards_description += f"{i}. {card['name']}\n"
+        cards_description = "🎴 **Выпавшие карты:**\n" + _format_cards_list(selected_cards)
             
         await update.message.reply_photo(
             photo=image_bytes,
@@ -645,87 +1021,142 @@ async def start_final_interpretation(update: Update, context: ContextTypes.DEFAU
     await continue_final_interpretation(update, context, chat_id, session_data)
 
 
+# Предложение - текст до завершающих знаков препинания вместе с пробелами после них;
+# строка без таких знаков считается одним предложением
+_SENTENCE_RE = re.compile(r'[^.!?…\n]*[.!?…]+\s*|[^\n]+')
+
+
+def _split_paragraph(paragraph: str, max_length: int) -> List[str]:
+    """
+    Разбивает слишком длинный параграф на части по границам предложений
+
+    Границы частей считаются по смещениям совпадений, текст нарезается срезами.
+    Предложение длиннее max_length режется по длине.
+
+    :param paragraph: Текст параграфа
+    :param max_length: Максимальная длина части
+    :return: Части параграфа
+    """
+    chunks = []
+    chunk_start = 0
+    last_end = 0
+    for match in _SENTENCE_RE.finditer(paragraph):
+        end = match.end()
+        if end - chunk_start > max_length and last_end > chunk_start:
+            chunks.append(paragraph[chunk_start:last_end].rstrip())
+            chunk_start = last_end
+        last_end = end
+    chunks.append(paragraph[chunk_start:])
+    
+    parts = []
+    for chunk in chunks:
+        if len(chunk) <= max_length:
+            parts.append(chunk)
+        else:
+            parts.extend(chunk[i:i + max_length] for i in range(0, len(chunk), max_length))
+    return parts
+
+
 def split_long_message(text: str, max_length: int) -> List[str]:
     """Разбивает длинное сообщение на части"""
     if len(text) <= max_length:
         return [text]
     
     parts = []
-    current_part = ""
+    # Текущая часть копится списком фрагментов и склеивается один раз при сбросе,
+    # её длина считается отдельно - без повторных конкатенаций строк
+    current = []
+    current_len = 0
     
     # Разбиваем по параграфам
-    paragraphs = text.split('\n\n')
-    
-    for paragraph in paragraphs:
-        if len(current_part) + len(paragraph) + 2 <= max_length:
-            if current_part:
-                current_part += '\n\n' + paragraph
-            else:
-                current_part = paragraph
-        else:
-            if current_part:
-                parts.append(current_part)
-                current_part = paragraph
-            else:
-                # Параграф слишком длинный - разбиваем по предложениям
-                sentences = paragraph.split('. ')
-                for sentence in sentences:
-                    if len(current_part) + len(sentence) + 2 <= max_length:
-                        if current_part:
-                            current_part += '. ' + sentence
-                        else:
-                            current_part = sentence
-                    else:
-                        if current_part:
-                            parts.append(current_part)
-                        current_part = sentence
+    for paragraph in text.split('\n\n'):
+        paragraph_len = len(paragraph)
+        if current_len and current_len + paragraph_len + 2 <= max_length:
+            current.append('\n\n')
+            current.append(paragraph)
+            current_len += paragraph_len + 2
+            continue
+        
+        if current_len:
+            parts.append(''.join(current))
+            current = []
+            current_len = 0
+        
+        if paragraph_len <= max_length:
+            current = [paragraph]
+            current_len = paragraph_len
+            continue
+        
+        # Параграф слишком длинный - разбиваем по предложениям, последняя часть
+        # остаётся текущей, чтобы к ней можно было добавить следующие параграфы
+        *complete, tail = _split_paragraph(paragraph, max_length)
+        parts.extend(complete)
+        current = [tail]
+        current_len = len(tail)
     
-    if current_part:
-        parts.append(current_part)
+    if current_len:
+        parts.append(''.join(current))
     
     return parts
 
 
+# Классификация ошибок OpenRouter за один проход по тексту ошибки.
+# Номер группы - приоритет категории (как в прежней цепочке if/elif)
+_LLM_ERROR_PATTERN = re.compile(
+    r"(rate limit|too many requests)|(insufficient credits|balance)|(timeout|connection)",
+    re.IGNORECASE
+)
+
+_LLM_ERROR_MESSAGES = (
+    # 1: превышен лимит запросов
+    "⏸️ **Сервер временно перегружен**\n\n"
+    "Слишком много запросов к нейросети. Пожалуйста, попробуйте через несколько минут.\n\n"
+    "🔄 Ваш расклад сохранен, можете вернуться к нему позже.",
+    # 2: закончились кредиты
+    "💳 **Временные технические проблемы**\n\n"
+    "К сожалению, сейчас не могу сгенерировать интерпретацию. Попробуйте позже.\n\n"
+    "🎴 Ваш расклад готов, интерпретация появится при следующем обращении.",
+    # 3: таймаут или проблемы соединения
+    "⏱️ **Превышено время ожидания**\n\n"
+    "Нейросеть слишком долго генерирует ответ. Попробуйте еще раз.\n\n"
+    "🔄 Обычно это занимает меньше времени."
+)
+
+_LLM_ERROR_DEFAULT_MESSAGE = (
+    "🤖 **Технические неполадки**\n\n"
+    "Произошла ошибка при обращении к нейросети. Попробуйте позже.\n\n"
+    "⚙️ Мы работаем над устранением проблемы."
+)
+
+_UNEXPECTED_ERROR_MESSAGE = (
+    "❌ **Не удалось создать интерпретацию**\n\n"
+    "Произошла неожиданная ошибка. Попробуйте создать расклад заново.\n\n"
+    "🔧 Если проблема повторяется, обратитесь к разработчику."
+)
+
+
+def _classify_llm_error(error: Exception) -> str:
+    """
+    Подбирает сообщение для пользователя по тексту ошибки LLM
+    
+    :param error: Исключение при обращении к LLM
+    :return: Текст сообщения об ошибке
+    """
+    if not isinstance(error, OpenRouterError):
+        return _UNEXPECTED_ERROR_MESSAGE
+    
+    # Если в тексте есть признаки нескольких категорий, выигрывает более приоритетная
+    categories = [match.lastindex for match in _LLM_ERROR_PATTERN.finditer(str(error))]
+    if not categories:
+        return _LLM_ERROR_DEFAULT_MESSAGE
+    return _LLM_ERROR_MESSAGES[min(categories) - 1]
+
+
 async def handle_llm_error(update: Update, context: ContextTypes.DEFAULT_TYPE, 
                           chat_id: int, error: Exception, progress_message=None) -> None:
     """Обрабатывает ошибки OpenRouter API и уведомляет пользователя"""
-    from src.openrouter_client import OpenRouterError
-    from src.keyboards import main_menu
-    
-    error_str = str(error).lower()
-    
     # Определяем тип ошибки
-    if isinstance(error, OpenRouterError):
-        if 'rate limit' in error_str or 'too many requests' in error_str:
-            error_message = (
-                "⏸️ **Сервер временно перегружен**\n\n"
-                "Слишком много запросов к нейросети. Пожалуйста, попробуйте через несколько минут.\n\n"
-                "🔄 Ваш расклад сохранен, можете вернуться к нему позже."
-            )
-        elif 'insufficient credits' in error_str or 'balance' in error_str:
-            error_message = (
-                "💳 **Временные технические проблемы**\n\n"
-                "К сожалению, сейчас не могу сгенерировать интерпретацию. Попробуйте позже.\n\n"
-                "🎴 Ваш расклад готов, интерпретация появится при следующем обращении."
-            )
-        elif 'timeout' in error_str or 'connection' in error_str:
-            error_message = (
-                "⏱️ **Превышено время ожидания**\n\n"
-                "Нейросеть слишком долго генерирует ответ. Попробуйте еще раз.\n\n"
-                "🔄 Обычно это занимает меньше времени."
-            )
-        else:
-            error_message = (
-                "🤖 **Технические неполадки**\n\n"
-                "Произошла ошибка при обращении к нейросети. Попробуйте позже.\n\n"
-                "⚙️ Мы работаем над устранением проблемы."
-            )
-    else:
-        error_message = (
-            "❌ **Не удалось создать интерпретацию**\n\n"
-            "Произошла неожиданная ошибка. Попробуйте создать расклад заново.\n\n"
-            "🔧 Если проблема повторяется, обратитесь к разработчику."
-        )
+    error_message = _classify_llm_error(error)
     
     logger.error(f"LLM ошибка для пользователя {chat_id}: {error}")
     
@@ -744,5 +1175,4 @@ async def handle_llm_error(update: Update, context: ContextTypes.DEFAULT_TYPE,
     )
     
     # Очищаем состояние пользователя
-    from src.simple_state import reset_to_idle
     reset_to_idle(chat_id, keep_data=False)
\ No newline at end of file
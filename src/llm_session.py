@@ -7,15 +7,42 @@ import logging
 import asyncio
 import random
 import time
-from typing import List, Dict, Optional, Any, Tuple
+from itertools import islice
+from typing import Awaitable, Callable, List, Dict, Optional, Any, Tuple
 from enum import Enum
 
 from src.openrouter_client import TarotLLMAgent, MessageContext
 from src.prompt_manager import PromptManager
 from src.config import load_config
+from src.llm_cache import get_llm_cache
 
 logger = logging.getLogger(__name__)
 
+# Разметка ответов LLM, разбираемая сессией
+_QUESTIONS_BLOCK_RE = re.compile(r'\[QUESTIONS_START\](.*?)\[QUESTIONS_END\]', re.DOTALL | re.IGNORECASE)
+# Номера вопросов "Q1:", "Q2:" - блок делится по ним split-ом, без поиска с lookahead
+_QUESTION_NUMBER_RE = re.compile(r'Q\d+:')
+_NUMBERED_LINE_RE = re.compile(r'^\d+\.\s*')
+_INTERPRETATION_RE = re.compile(r'\[INTERPRETATION_START\](.*?)\[INTERPRETATION_END\]', re.DOTALL | re.IGNORECASE)
+
+# Максимум уточняющих вопросов по типу расклада (для остальных - DEFAULT_MAX_QUESTIONS)
+MAX_QUESTIONS_BY_SPREAD = {
+    'single_card': 2,
+    'three_cards': 3,
+    'horseshoe': 4,
+    'love_triangle': 5,
+    'celtic_cross': 6,
+    'week_forecast': 4,
+    'year_wheel': 5
+}
+DEFAULT_MAX_QUESTIONS = 3
+
+# Разделы объединённого ответа этапов 2-3 (см. stage_2_3_combined)
+_CONTEXT_ANALYSIS_RE = re.compile(r'\[CONTEXT_ANALYSIS\](.*?)\[/CONTEXT_ANALYSIS\]', re.DOTALL | re.IGNORECASE)
+_SYNTHESIS_RE = re.compile(r'\[SYNTHESIS\](.*?)\[/SYNTHESIS\]', re.DOTALL | re.IGNORECASE)
+# Текст после последнего известного заголовка единого ответа этапов 2-4 (см. stage_2_4_single_request)
+_SINGLE_REQUEST_TAIL_RE = re.compile(r'.*(?:\[INTERPRETATION_START\]|\[/SYNTHESIS\])(.*)', re.DOTALL | re.IGNORECASE)
+
 def _generate_random_magic_number(user_id: int) -> int:
     """
     Генерирует случайное магическое число для LLM сессии при отключенных magic numbers
@@ -89,20 +116,29 @@ class MultiStageLLMSession:
         # Очищаем контекст и начинаем с первых 3 промптов
         self.context.clear()
         
+        # Сначала идут тексты, общие для всех пользователей (кэшируемый префикс промпта),
+        # затем данные конкретной сессии: провайдер кэширует только точное совпадение начала
+        
         # Промпт 1: Системная персона
-        system_prompt = self.prompt_manager.get_system_persona(self.user_name, self.user_age)
-        self.context.add_system_message(system_prompt)
+        self.context.add_system_message(self.prompt_manager.get_system_persona())
+        self.context.mark_cache_prefix()
+        
+        # Промпт 2: Описание расклада (без карт) - одинаково для всех раскладов этого типа
+        self.context.add_user_message(self.prompt_manager.get_spread_template(self.spread_type))
+        self.context.mark_cache_prefix()
         
-        # Промпт 2: Контекст конкретного расклада
+        # Данные пользователя и выпавшие карты - одним сообщением пользователя: системные
+        # сообщения некоторые провайдеры (Anthropic) переносят в начало промпта, перед
+        # общим префиксом, поэтому в системной роли остаётся только персона
         # Подготавливаем позиции из spread_config - это список строк, а не словарей
         positions = self.spread_config.get('card_meanings', ['Позиция'])
+        self.context.add_user_message("\n\n".join((
+            self.prompt_manager.get_user_profile(self.user_name, self.user_age),
+            self.prompt_manager.get_spread_cards_block(self.selected_cards, positions)
+        )))
         
-        spread_context = self.prompt_manager.get_spread_context(
-            self.spread_type, 
-            self.selected_cards, 
-            positions
-        )
-        self.context.add_user_message(spread_context)
+        # Всё выше одинаково для всех этапов сессии - отмечаем как кэшируемый префикс
+        self.context.mark_cache_prefix()
         
         # Добавляем предварительные ответы в контекст
         preliminary_context = self._format_preliminary_answers()
@@ -137,11 +173,13 @@ class MultiStageLLMSession:
 
     # ==================== ЭТАП 2: АНАЛИЗ КОНТЕКСТА ====================
 
-    async def stage_2_context_analysis(self, user_answers: List[str]) -> str:
+    async def stage_2_context_analysis(self, user_answers: List[str],
+                                       on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
         """
         Этап 2: Анализ контекста и интерпретация карт (25% → 50%)
         
         :param user_answers: Ответы пользователя на дополнительные вопросы
+        :param on_partial: Корутина, получающая накопленный текст ответа по мере стриминга
         :return: Результат анализа контекста
         """
         logger.info("=== ЭТАП 2: Анализ контекста и интерпретация карт ===")
@@ -160,7 +198,7 @@ class MultiStageLLMSession:
         
         # Делаем ОТДЕЛЬНЫЙ LLM запрос для анализа
         logger.info("Отправляем запрос на анализ контекста...")
-        response = await self.agent.send_request(self.context)
+        response = await self._request(on_partial)
         
         # ВАЖНО: Добавляем ответ в контекст для следующего этапа
         self.context.add_assistant_message(response)
@@ -170,10 +208,11 @@ class MultiStageLLMSession:
 
     # ==================== ЭТАП 3: ГЛУБОКИЙ СИНТЕЗ ====================
 
-    async def stage_3_deep_synthesis(self) -> str:
+    async def stage_3_deep_synthesis(self, on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
         """
         Этап 3: Глубокий синтез и планирование рассказа (50% → 75%)
         
+        :param on_partial: Корутина, получающая накопленный текст ответа по мере стриминга
         :return: Результат глубокого синтеза
         """
         logger.info("=== ЭТАП 3: Глубокий синтез и планирование рассказа ===")
@@ -186,7 +225,7 @@ class MultiStageLLMSession:
         
         # Делаем ОТДЕЛЬНЫЙ LLM запрос для синтеза
         logger.info("Отправляем запрос на глубокий синтез...")
-        response = await self.agent.send_request(self.context)
+        response = await self._request(on_partial)
         
         # ВАЖНО: Добавляем ответ в контекст для финального этапа
         self.context.add_assistant_message(response)
@@ -194,12 +233,110 @@ class MultiStageLLMSession:
         logger.info("Этап 3 завершен: глубокий синтез выполнен")
         return response
 
+    # ==================== ЭТАПЫ 2-3 ОДНИМ ЗАПРОСОМ ====================
+
+    async def stage_2_3_combined(self, user_answers: List[str],
+                                 on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        Этапы 2 и 3 одним запросом к LLM (25% → 75%)
+        
+        Промпты анализа контекста и синтеза отправляются вместе, модель отвечает двумя
+        размеченными разделами. После ответа история приводится к виду последовательного
+        прохода (промпт 04, анализ, промпт 05, синтез), поэтому этап 4 не меняется.
+        Если разделы не найдены, ответ остаётся в истории целиком.
+        
+        :param user_answers: Ответы пользователя на дополнительные вопросы
+        :param on_partial: Корутина, получающая накопленный текст ответа по мере стриминга
+        :return: Результат синтеза (или весь ответ, если разделы не найдены)
+        """
+        logger.info("=== ЭТАПЫ 2-3: Анализ контекста и глубокий синтез одним запросом ===")
+        
+        self.llm_answers = user_answers
+        self.current_stage = InterpretationStage.CONTEXT_ANALYSIS
+        
+        self.context.add_user_message(self._format_user_answers())
+        
+        context_analysis_prompt = self.prompt_manager.get_context_analysis_prompt()
+        self.context.add_user_message(self._format_context_analysis_prompt(context_analysis_prompt))
+        self.context.add_user_message(self.prompt_manager.get_combined_analysis_synthesis_prompt())
+        
+        logger.info("Отправляем объединённый запрос на анализ и синтез...")
+        response = await self._request(on_partial)
+        
+        self.current_stage = InterpretationStage.DEEP_SYNTHESIS
+        
+        analysis_match = _CONTEXT_ANALYSIS_RE.search(response)
+        synthesis_match = _SYNTHESIS_RE.search(response)
+        if not (analysis_match and synthesis_match):
+            logger.warning("Разделы объединённого ответа не найдены, сохраняем ответ целиком")
+            self.context.add_assistant_message(response)
+            return response
+        
+        # Вместо объединённого промпта - последовательность, как при двух отдельных запросах
+        self.context.pop_message()
+        self.context.add_assistant_message(analysis_match.group(1).strip())
+        self.context.add_user_message(self.prompt_manager.get_synthesis_prompt())
+        synthesis = synthesis_match.group(1).strip()
+        self.context.add_assistant_message(synthesis)
+        
+        logger.info("Этапы 2-3 завершены одним запросом")
+        return synthesis
+
+    # ==================== ЭТАПЫ 2-4 ОДНИМ ЗАПРОСОМ ====================
+
+    async def stage_2_4_single_request(self, user_answers: List[str],
+                                       on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        Этапы 2, 3 и 4 одним запросом к LLM (25% → 100%)
+        
+        Промпты анализа контекста, синтеза и финального ответа отправляются вместе, модель
+        отвечает размеченными разделами. Промежуточные результаты пользователю не показываются,
+        поэтому из ответа берётся только финальная интерпретация. Если её не удаётся отделить
+        от анализа и синтеза, этапы 2-4 выполняются последовательно.
+        
+        :param user_answers: Ответы пользователя на дополнительные вопросы
+        :param on_partial: Корутина, получающая накопленный текст ответа по мере стриминга
+        :return: Финальная интерпретация в формате для пользователя
+        """
+        logger.info("=== ЭТАПЫ 2-4: Анализ, синтез и финальная интерпретация одним запросом ===")
+        
+        self.llm_answers = user_answers
+        self.current_stage = InterpretationStage.CONTEXT_ANALYSIS
+        
+        self.context.add_user_message(self._format_user_answers())
+        
+        context_analysis_prompt = self.prompt_manager.get_context_analysis_prompt()
+        self.context.add_user_message(self._format_context_analysis_prompt(context_analysis_prompt))
+        self.context.add_user_message(self.prompt_manager.get_single_request_interpretation_prompt())
+        
+        logger.info("Отправляем единый запрос на анализ, синтез и финальный ответ...")
+        response = await self._request(on_partial)
+        
+        final_interpretation = self._extract_single_request_interpretation(response)
+        if final_interpretation is None:
+            # Без финального раздела ответ содержит только анализ и синтез - их пользователю
+            # не показываем, а повторяем этапы 2-4 последовательно с того же места диалога
+            logger.warning("⚠️ Финальный раздел в едином ответе не найден, выполняем этапы 2-4 последовательно")
+            for _ in range(3):
+                self.context.pop_message()
+            await self.stage_2_context_analysis(user_answers)
+            await self.stage_3_deep_synthesis()
+            return await self.stage_4_final_response()
+        
+        self.current_stage = InterpretationStage.FINAL_RESPONSE
+        self.context.add_assistant_message(response)
+        
+        logger.info("Этапы 2-4 завершены одним запросом: финальная интерпретация готова")
+        return final_interpretation
+
     # ==================== ЭТАП 4: ФИНАЛЬНАЯ ИНТЕРПРЕТАЦИЯ ====================
 
-    async def stage_4_final_response(self) -> str:
+    async def stage_4_final_response(self, on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
         """
         Этап 4: Генерация финальной интерпретации для пользователя (75% → 100%)
         
+        :param on_partial: Корутина, получающая накопленный текст ответа по мере стриминга.
+                           Если не задана, ответ запрашивается целиком
         :return: Финальная интерпретация в формате для пользователя
         """
         logger.info("=== ЭТАП 4: Генерация финальной интерпретации ===")
@@ -212,7 +349,7 @@ class MultiStageLLMSession:
         
         # Делаем ФИНАЛЬНЫЙ LLM запрос
         logger.info("Отправляем запрос на генерацию финального ответа...")
-        response = await self.agent.send_request(self.context)
+        response = await self._request(on_partial)
         
         # Парсим финальную интерпретацию
         final_interpretation = self._parse_final_interpretation(response)
@@ -222,94 +359,128 @@ class MultiStageLLMSession:
 
     # ==================== ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ ====================
 
+    async def _request(self, on_partial: Optional[Callable[[str], Awaitable[None]]]) -> str:
+        """
+        Отправляет текущий контекст в LLM: стримингом, если задан on_partial, иначе целиком
+        
+        :param on_partial: Корутина для частичного ответа или None
+        :return: Полный текст ответа
+        """
+        if on_partial is None:
+            return await self.agent.send_request(self.context)
+        return await self._stream_response(on_partial)
+
+    async def _stream_response(self, on_partial: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Получает ответ LLM в режиме стриминга, передавая накопленный текст в on_partial
+        
+        :param on_partial: Корутина, получающая накопленный текст ответа
+        :return: Полный текст ответа
+        """
+        chunks = []
+        async for delta in self.agent.send_request_stream(self.context):
+            chunks.append(delta)
+            try:
+                await on_partial("".join(chunks))
+            except Exception as e:
+                # Сбой отображения не должен прерывать генерацию
+                logger.warning(f"Ошибка обработки частичного ответа: {e}")
+        
+        return "".join(chunks).strip()
+
 
     def _format_preliminary_answers(self) -> str:
         """Форматирует предварительные ответы пользователя"""
-        answers_text = f"**Предварительные ответы пользователя {self.user_name}:**\n\n"
-        for i, answer in enumerate(self.preliminary_answers, 1):
-            if isinstance(answer, dict):
-                answers_text += f"{i}. {answer.get('question_text', 'Вопрос')}: {answer.get('answer', 'Нет ответа')}\n"
-            else:
-                answers_text += f"{i}. {answer}\n"
-        
-        return answers_text
+        header = f"**Предварительные ответы пользователя {self.user_name}:**\n\n"
+        return header + "".join(
+            f"{i}. {answer.get('question_text', 'Вопрос')}: {answer.get('answer', 'Нет ответа')}\n"
+            if isinstance(answer, dict) else f"{i}. {answer}\n"
+            for i, answer in enumerate(self.preliminary_answers, 1)
+        )
 
     def _format_user_answers(self) -> str:
         """Форматирует ответы пользователя на дополнительные вопросы"""
-        answers_text = f"**Ответы пользователя на дополнительные вопросы:**\n\n"
-        for i, (question, answer) in enumerate(zip(self.llm_questions, self.llm_answers), 1):
-            answers_text += f"**Вопрос {i}:** {question}\n"
-            answers_text += f"**Ответ:** {answer}\n\n"
-        
-        return answers_text
+        header = "**Ответы пользователя на дополнительные вопросы:**\n\n"
+        return header + "".join(
+            f"**Вопрос {i}:** {question}\n**Ответ:** {answer}\n\n"
+            for i, (question, answer) in enumerate(zip(self.llm_questions, self.llm_answers), 1)
+        )
 
     def _format_context_analysis_prompt(self, prompt: str) -> str:
         """Форматирует промпт анализа контекста с данными карт"""
-        cards_detailed = ""
+        parts = []
         for card in self.selected_cards:
-            cards_detailed += f"**{card['name']}:**\n"
-            cards_detailed += f"- Значения: {card.get('fortune_telling', [])}\n"
-            cards_detailed += f"- Ключевые слова: {card.get('keywords', [])}\n"
+            parts.append(f"**{card['name']}:**\n")
+            parts.append(f"- Значения: {card.get('fortune_telling', [])}\n")
+            parts.append(f"- Ключевые слова: {card.get('keywords', [])}\n")
             if 'meanings' in card:
-                cards_detailed += f"- Светлые значения: {card['meanings'].get('light', [])}\n"
-                cards_detailed += f"- Теневые значения: {card['meanings'].get('shadow', [])}\n"
-            cards_detailed += "\n"
+                parts.append(f"- Светлые значения: {card['meanings'].get('light', [])}\n")
+                parts.append(f"- Теневые значения: {card['meanings'].get('shadow', [])}\n")
+            parts.append("\n")
+        cards_detailed = "".join(parts)
         
         return prompt.replace("{detailed_cards_info}", cards_detailed)
 
     def _extract_questions_from_response(self, response: str) -> List[str]:
         """Извлекает вопросы из ответа LLM"""
+        # Количество вопросов ограничено по типу расклада - разбор останавливается на лимите
+        limit = MAX_QUESTIONS_BY_SPREAD.get(self.spread_type, DEFAULT_MAX_QUESTIONS)
         questions = []
         
         # Способ 1: Маркеры [QUESTIONS_START] и [QUESTIONS_END]
-        questions_match = re.search(r'\[QUESTIONS_START\](.*?)\[QUESTIONS_END\]', response, re.DOTALL | re.IGNORECASE)
+        questions_match = _QUESTIONS_BLOCK_RE.search(response)
         if questions_match:
             questions_block = questions_match.group(1).strip()
-            q_matches = re.findall(r'Q\d+:\s*(.+?)(?=Q\d+:|$)', questions_block, re.DOTALL)
-            questions.extend([q.strip() for q in q_matches if self._validate_question(q.strip())])
+            # Текст до первого номера - не вопрос
+            q_matches = (q.strip() for q in _QUESTION_NUMBER_RE.split(questions_block)[1:])
+            questions.extend(islice((q for q in q_matches if self._validate_question(q)), limit))
         
         # Способ 2: Нумерованный список
         if not questions:
-            lines = response.split('\n')
-            for line in lines:
+            for line in response.split('\n'):
                 line = line.strip()
-                if re.match(r'^\d+\.', line) and '?' in line:
-                    question = re.sub(r'^\d+\.\s*', '', line)
+                number_match = _NUMBERED_LINE_RE.match(line)
+                if number_match and '?' in line:
+                    question = line[number_match.end():]
                     if self._validate_question(question):
                         questions.append(question)
+                        if len(questions) >= limit:
+                            break
         
-        # Ограничиваем количество вопросов по типу расклада
-        max_questions = {
-            'single_card': 2,
-            'three_cards': 3,
-            'horseshoe': 4,
-            'love_triangle': 5,
-            'celtic_cross': 6,
-            'week_forecast': 4,
-            'year_wheel': 5
-        }
-        
-        limit = max_questions.get(self.spread_type, 3)
-        return questions[:limit]
+        return questions
 
     def _validate_question(self, question: str) -> bool:
         """Валидирует отдельный вопрос"""
-        if not question or len(question.strip()) < 10:
+        # Сначала дешёвые проверки длины, поиск '?' - только для подходящих кандидатов
+        if len(question) > 500 or len(question.strip()) < 10:
             return False
-        if len(question) > 500:
-            return False
-        if '?' not in question:
-            return False
-        return True
+        return '?' in question
 
+    def _extract_single_request_interpretation(self, response: str) -> Optional[str]:
+        """
+        Выделяет финальную интерпретацию из единого ответа этапов 2-4
+        
+        Если модель не закрыла или не поставила маркеры интерпретации, берётся текст после
+        последнего известного заголовка ([INTERPRETATION_START] или [/SYNTHESIS]).
+        
+        :param response: Ответ LLM
+        :return: Финальная интерпретация или None, если её не удалось отделить от анализа и синтеза
+        """
+        interpretation_match = _INTERPRETATION_RE.search(response)
+        if interpretation_match:
+            return interpretation_match.group(1).strip()
+        
+        tail_match = _SINGLE_REQUEST_TAIL_RE.match(response)
+        if tail_match and tail_match.group(1).strip():
+            logger.warning("⚠️ Маркеры интерпретации не найдены, берём текст после последнего раздела")
+            return tail_match.group(1).strip()
+        
+        return None
+    
     def _parse_final_interpretation(self, response: str) -> str:
         """Парсит финальную интерпретацию из ответа"""
         # Ищем интерпретацию между маркерами
-        interpretation_match = re.search(
-            r'\[INTERPRETATION_START\](.*?)\[INTERPRETATION_END\]', 
-            response, 
-            re.DOTALL | re.IGNORECASE
-        )
+        interpretation_match = _INTERPRETATION_RE.search(response)
         
         if interpretation_match:
             return interpretation_match.group(1).strip()
@@ -325,7 +496,8 @@ class MultiStageLLMSession:
             'message_count': len(self.context.messages),
             'total_length': sum(len(msg.get('content', '')) for msg in self.context.messages),
             'has_questions': len(self.llm_questions) > 0,
-            'has_answers': len(self.llm_answers) > 0
+            'has_answers': len(self.llm_answers) > 0,
+            'response_cache': get_llm_cache().stats if self.agent.use_response_cache else None
         }
 
     # ==================== АДАПТЕРЫ ДЛЯ ОБРАТНОЙ СОВМЕСТИМОСТИ ====================
@@ -362,10 +534,17 @@ class MultiStageLLMSession:
     async def continue_interpretation(self, user_answers: List[str]) -> str:
         """
         Продолжает интерпретацию после получения ответов пользователя
-        Выполняет этапы 2, 3, 4 последовательно
+        Выполняет этапы 2, 3, 4 последовательно или одним запросом
+        (флаг features.single_request_interpretation)
         """
         logger.info("Продолжаем многоэтапную интерпретацию...")
         
+        if load_config().get('features', {}).get('single_request_interpretation', False):
+            # Этапы 2-4 одним запросом (25% → 100%)
+            final_interpretation = await self.stage_2_4_single_request(user_answers)
+            logger.info("🎯 Многоэтапная интерпретация завершена!")
+            return final_interpretation
+        
         # Этап 2: Анализ контекста (25% → 50%)
         await self.stage_2_context_analysis(user_answers)
         
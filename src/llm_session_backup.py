@@ -58,10 +58,11 @@ class LLMSession:
         self.spread_data = spread_data
         
         # Этап 1: Системный промпт (01_system_persona.md)
-        system_prompt = self.prompt_manager.get_system_persona(
-            name=user_data.get('name', 'Друг'),
-            age=user_data.get('age', 25)
-        )
+        # Персона общая для всех пользователей, данные пользователя - отдельным блоком после неё
+        system_prompt = "\n\n".join((
+            self.prompt_manager.get_system_persona(),
+            self.prompt_manager.get_user_profile(user_data.get('name', 'Друг'), user_data.get('age', 25))
+        ))
         
         # Добавляем системный промпт в контекст
         self.context.add_user_message(system_prompt)
@@ -358,27 +359,25 @@ class LLMSession:
         if not interpretation or len(interpretation.strip()) < 50:
             return False
         
+        # Текст в нижнем регистре нужен обеим проверкам ниже - приводим его один раз
+        text_lower = interpretation.lower()
+        
         # Проверяем упоминание карт (хотя бы одна из карт должна быть упомянута)
         cards = self.spread_data.get('cards', [])
-        cards_mentioned = False
-        for card in cards:
-            card_name = card.get('name', '').lower()
-            if any(word in interpretation.lower() for word in card_name.split()):
-                cards_mentioned = True
-                break
+        card_words = {word for card in cards for word in card.get('name', '').lower().split()}
+        cards_mentioned = any(word in text_lower for word in card_words)
         
         if not cards_mentioned:
             logger.warning("В интерпретации не упоминаются выпавшие карты")
         
         # Проверяем наличие эмодзи (желательно, но не критично)
-        has_emoji = any(ord(char) > 127 for char in interpretation)
-        if not has_emoji:
+        # str.isascii() - одна проверка на уровне C вместо генератора по символам
+        if interpretation.isascii():
             logger.info("В интерпретации нет эмодзи")
         
         # Проверяем связность (не слишком много повторений)
-        words = interpretation.lower().split()
-        unique_words = set(words)
-        word_ratio = len(unique_words) / len(words) if words else 0
+        words = text_lower.split()
+        word_ratio = len(set(words)) / len(words) if words else 0
         
         if word_ratio < 0.3:  # Слишком много повторений
             logger.warning("Интерпретация содержит слишком много повторений")
@@ -12,6 +12,10 @@ from .config import load_config
 
 logger = logging.getLogger(__name__)
 
+# Шаблоны разбора ответа компилируются один раз при импорте модуля
+_INTERPRETATION_RE = re.compile(r'\[INTERPRETATION_START\](.*?)\[INTERPRETATION_END\]', re.DOTALL | re.IGNORECASE)
+_INTERPRETATION_MARKER_RE = re.compile(r'\[INTERPRETATION_(START|END)\]')
+
 
 class InterpretationStage:
     """Этапы интерпретации"""
@@ -87,28 +91,35 @@ class FixedLLMSession:
         Это и есть правильная реализация по LLM_algorithm.md!
         """
         try:
+            # Сначала тексты, общие для всех пользователей (кэшируемый префикс промпта),
+            # затем данные конкретного пользователя и расклада
+            self.context = MessageContext(task_prompt=None)
+            
             # 1. Системная персона (01_system_persona.md)
-            system_prompt = self.prompt_manager.get_system_persona(
-                name=self.user_data['name'],
-                age=self.user_data['age']
-            )
-            self.context = MessageContext(task_prompt=system_prompt)
+            self.context.add_system_message(self.prompt_manager.get_system_persona())
+            self.context.mark_cache_prefix()
             logger.info("1️⃣ Добавлен системный промпт")
             
-            # 2. Контекст расклада (02_*_context.md)
+            # 2. Контекст расклада (02_*_context.md) - описание без карт, затем данные
+            # пользователя и выпавшие карты
             spread_type = self.spread_data.get('spread_type', '')
-            spread_prompt = self.prompt_manager.get_spread_context(
-                spread_type=spread_type,
-                selected_cards=self.spread_data['selected_cards'],
-                positions=self.spread_data['spread_config'].get('card_meanings', [])
-            )
-            self.context.add_user_message(spread_prompt)
+            self.context.add_user_message(self.prompt_manager.get_spread_template(spread_type))
+            self.context.mark_cache_prefix()
+            # Данные пользователя - в сообщении пользователя, а не системном: системные сообщения
+            # некоторые провайдеры переносят в начало промпта, перед общим префиксом
+            self.context.add_user_message("\n\n".join((
+                self.prompt_manager.get_user_profile(self.user_data['name'], self.user_data['age']),
+                self.prompt_manager.get_spread_cards_block(
+                    selected_cards=self.spread_data['selected_cards'],
+                    positions=self.spread_data['spread_config'].get('card_meanings', [])
+                )
+            )))
             logger.info(f"2️⃣ Добавлен контекст расклада: {spread_type}")
             
             # Добавляем предварительные ответы
             if preliminary_answers:
-                answers_text = "\\n".join([f"{i+1}. {answer}" for i, answer in enumerate(preliminary_answers)])
-                self.context.add_user_message(f"ПРЕДВАРИТЕЛЬНЫЕ ОТВЕТЫ ПОЛЬЗОВАТЕЛЯ:\\n{answers_text}")
+                answers_text = "\n".join([f"{i+1}. {answer}" for i, answer in enumerate(preliminary_answers)])
+                self.context.add_user_message(f"ПРЕДВАРИТЕЛЬНЫЕ ОТВЕТЫ ПОЛЬЗОВАТЕЛЯ:\n{answers_text}")
                 logger.info("📝 Добавлены предварительные ответы")
             
             # 3. Психологический анализ и вопросы (03_psychological_analysis_questions.md) 
@@ -120,8 +131,8 @@ class FixedLLMSession:
             
             # Добавляем дополнительные ответы если есть
             if additional_answers:
-                additional_text = "\\n".join([f"{i+1}. {answer}" for i, answer in enumerate(additional_answers)])
-                self.context.add_user_message(f"ДОПОЛНИТЕЛЬНЫЕ ОТВЕТЫ НА УТОЧНЯЮЩИЕ ВОПРОСЫ:\\n{additional_text}")
+                additional_text = "\n".join([f"{i+1}. {answer}" for i, answer in enumerate(additional_answers)])
+                self.context.add_user_message(f"ДОПОЛНИТЕЛЬНЫЕ ОТВЕТЫ НА УТОЧНЯЮЩИЕ ВОПРОСЫ:\n{additional_text}")
                 logger.info("📝 Добавлены дополнительные ответы")
             
             # 4. Анализ контекста и карт (04_context_analysis_and_card_interpretation.md)
@@ -156,18 +167,24 @@ class FixedLLMSession:
             # Логируем для отладки 
             logger.info(f"Отправляем запрос с {len(messages)} сообщениями в контексте")
             
-            # Проверяем что требование к краткости присутствует
-            full_context = "\\n".join([msg['content'][0]['text'] for msg in messages])
-            has_brevity = "Требование к краткости" in full_context
+            # Проверяем что требование к краткости присутствует (без склейки всего контекста)
+            has_brevity = self._context_contains(messages, "Требование к краткости")
             logger.info(f"Требование к краткости в контексте: {has_brevity}")
             
-            from .openrouter_client import send_request
+            from .openrouter_client import send_request, uses_explicit_prompt_cache
+            
+            # Точки кэширования - на концах общих для пользователей частей (персона, описание расклада)
+            cache_breakpoints = ()
+            if uses_explicit_prompt_cache(self.model_name):
+                cache_breakpoints = tuple(self.context.cache_prefix_indices)
+            
             response = await send_request(
                 messages=messages,
                 model=self.model_name,
                 api_key=self.api_key,
                 max_tokens=self.max_tokens,
-                temperature=self.temperature
+                temperature=self.temperature,
+                cache_breakpoints=cache_breakpoints
             )
             
             self.current_stage = InterpretationStage.FINAL_RESPONSE
@@ -185,15 +202,14 @@ class FixedLLMSession:
         """Извлекает финальную интерпретацию из ответа LLM"""
         try:
             # Способ 1: Ищем маркеры [INTERPRETATION_START] и [INTERPRETATION_END]
-            interpretation_match = re.search(r'\\[INTERPRETATION_START\\](.*?)\\[INTERPRETATION_END\\]', 
-                                           response, re.DOTALL | re.IGNORECASE)
+            interpretation_match = _INTERPRETATION_RE.search(response)
             if interpretation_match:
                 cleaned = interpretation_match.group(1).strip()
                 logger.info("✅ Интерпретация извлечена по маркерам")
                 return cleaned
             
             # Способ 2: Ищем последний блок после финального промпта
-            lines = response.split('\\n')
+            lines = response.split('\n')
             interpretation_lines = []
             capturing = False
             
@@ -205,9 +221,9 @@ class FixedLLMSession:
                     interpretation_lines.append(line)
             
             if interpretation_lines:
-                result = '\\n'.join(interpretation_lines).strip()
+                result = '\n'.join(interpretation_lines).strip()
                 # Очищаем от возможных маркеров
-                result = re.sub(r'\\[INTERPRETATION_(START|END)\\]', '', result).strip()
+                result = _INTERPRETATION_MARKER_RE.sub('', result).strip()
                 logger.info("✅ Интерпретация извлечена по блокам")
                 return result
             
@@ -225,16 +241,36 @@ class FixedLLMSession:
             logger.error(f"Ошибка при извлечении интерпретации: {e}")
             return response.strip()
     
+    @staticmethod
+    def _context_contains(messages: List[Dict], substring: str) -> bool:
+        """Проверяет вхождение подстроки в тексты сообщений по одному, без склейки контекста"""
+        return any(substring in msg['content'][0]['text'] for msg in messages)
+    
     def get_context_debug_info(self) -> Dict:
         """Возвращает отладочную информацию о контексте"""
         messages = self.context.get_message_history()
-        full_context = "\\n".join([msg['content'][0]['text'] for msg in messages])
+        texts = [msg['content'][0]['text'] for msg in messages]
+        separator = "\n"
+        # Длина склеенного контекста - без построения самой строки
+        total_length = sum(map(len, texts)) + len(separator) * max(len(texts) - 1, 0)
+        
+        # Для превью склеиваем только начальные сообщения
+        preview_parts = []
+        preview_length = 0
+        for text in texts:
+            preview_parts.append(text)
+            preview_length += len(text)
+            if preview_length > 500:
+                break
+            preview_length += len(separator)
+        preview = separator.join(preview_parts)
         
         return {
             'message_count': len(messages),
-            'total_length': len(full_context),
-            'has_brevity_instruction': 'Требование к краткости' in full_context,
-            'has_system_persona': '01_system_persona' in full_context,
-            'has_spread_context': '02_' in full_context and '_context' in full_context,
-            'context_preview': full_context[:500] + '...' if len(full_context) > 500 else full_context
+            'total_length': total_length,
+            'has_brevity_instruction': self._context_contains(messages, 'Требование к краткости'),
+            'has_system_persona': self._context_contains(messages, '01_system_persona'),
+            'has_spread_context': (self._context_contains(messages, '02_')
+                                   and self._context_contains(messages, '_context')),
+            'context_preview': preview[:500] + '...' if total_length > 500 else preview
         }
\ No newline at end of file
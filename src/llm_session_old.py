@@ -95,10 +95,11 @@ class LLMSession:
         """
         try:
             # 1. Системная персона (01_system_persona.md)
-            system_prompt = self.prompt_manager.get_system_persona(
-                name=self.user_data['name'],
-                age=self.user_data['age']
-            )
+            # Персона общая для всех пользователей, данные пользователя - отдельным блоком после неё
+            system_prompt = "\n\n".join((
+                self.prompt_manager.get_system_persona(),
+                self.prompt_manager.get_user_profile(self.user_data['name'], self.user_data['age'])
+            ))
             self.context = MessageContext(task_prompt=system_prompt)
             logger.info("1️⃣ Добавлен системный промпт")
             
@@ -350,10 +351,11 @@ class LLMSession:
         # Добавляем первые 3 промпта для генерации вопросов
         try:
             # 1. Системная персона 
-            system_prompt = self.prompt_manager.get_system_persona(
-                name=self.user_data['name'],
-                age=self.user_data['age']
-            )
+            # Персона общая для всех пользователей, данные пользователя - отдельным блоком после неё
+            system_prompt = "\n\n".join((
+                self.prompt_manager.get_system_persona(),
+                self.prompt_manager.get_user_profile(self.user_data['name'], self.user_data['age'])
+            ))
             self.context = MessageContext(task_prompt=system_prompt)
             
             # 2. Контекст расклада
@@ -4,9 +4,14 @@ import base64
 import aiohttp
 import asyncio
 import json
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Sequence, Tuple
 from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class OpenRouterError(Exception):
     """Ошибка при работе с OpenRouter API"""
@@ -27,6 +32,9 @@ class MessageContext:
         """
         self.task_prompt = task_prompt
         self.messages = []
+        # Индексы сообщений, которыми заканчиваются неизменные части контекста
+        # (точки кэширования префикса промпта)
+        self.cache_prefix_indices = []
     
     def add_user_message(self, text: str):
         """
@@ -69,6 +77,16 @@ class MessageContext:
             "content": [{"type": "text", "text": text}]
         })
     
+    def pop_message(self) -> Dict[str, Any]:
+        """
+        Удаляет и возвращает последнее сообщение
+        
+        :return: Удалённое сообщение
+        """
+        message = self.messages.pop()
+        self.cache_prefix_indices = [i for i in self.cache_prefix_indices if i < len(self.messages)]
+        return message
+    
     def get_message_history(self) -> List[Dict[str, Any]]:
         """
         Возвращает копию списка сообщений
@@ -77,9 +95,21 @@ class MessageContext:
         """
         return self.messages.copy()
     
+    def mark_cache_prefix(self):
+        """
+        Отмечает текущий конец истории как неизменный префикс промпта
+        
+        Все последующие запросы сессии начинаются с этих сообщений, поэтому
+        провайдер может закэшировать их обработку. Отметок может быть несколько:
+        например, общая для всех пользователей персона и контекст конкретного расклада
+        """
+        if self.messages:
+            self.cache_prefix_indices.append(len(self.messages) - 1)
+    
     def clear(self):
         """Очищает историю сообщений"""
         self.messages.clear()
+        self.cache_prefix_indices = []
     
     def update_task_prompt(self, new_task_prompt: str):
         """
@@ -96,11 +126,32 @@ class MessageContext:
             })
 
 
-def _convert_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+# Провайдеры, которым точки кэширования промпта нужно указывать явно (cache_control).
+# OpenAI, DeepSeek и другие кэшируют общий префикс запросов автоматически
+_EXPLICIT_PROMPT_CACHE_PREFIXES = ("anthropic/", "google/gemini")
+
+# Максимум блоков с cache_control в одном запросе (ограничение Anthropic)
+MAX_CACHE_BREAKPOINTS = 4
+
+
+def uses_explicit_prompt_cache(model: str) -> bool:
+    """
+    Проверяет, нужно ли для модели размечать кэшируемый префикс промпта
+    
+    :param model: Название модели OpenRouter
+    :return: True для моделей с явным cache_control
+    """
+    return model.startswith(_EXPLICIT_PROMPT_CACHE_PREFIXES)
+
+
+def _convert_messages(messages: List[Dict[str, Any]],
+                      cache_breakpoints: Sequence[int] = ()) -> List[Dict[str, Any]]:
     """
     Конвертирует сообщения в простой текстовый формат для API
     
     :param messages: Список сообщений
+    :param cache_breakpoints: Индексы сообщений, на которых заканчивается кэшируемый
+                              префикс. Их текст отправляется блоком с cache_control
     :return: Сконвертированные сообщения
     """
     converted = []
@@ -123,6 +174,9 @@ def _convert_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         if not isinstance(content, str):
             content = str(content)
         
+        if idx in cache_breakpoints:
+            content = [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}]
+        
         converted.append({
             "role": msg["role"],
             "content": content
@@ -131,6 +185,71 @@ def _convert_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return converted
 
 
+def _encode_payload(payload: Dict[str, Any]) -> bytes:
+    """
+    Сериализует тело запроса в компактный UTF-8 JSON
+
+    По умолчанию aiohttp кодирует json= с ensure_ascii=True, и каждый символ
+    кириллицы превращается в 6-байтовую последовательность \\uXXXX. История
+    сообщений пересылается целиком на каждом этапе, поэтому тело запроса
+    формируется один раз и без экранирования. Если установлен orjson,
+    сериализация выполняется им.
+
+    :param payload: Тело запроса
+    :return: Закодированное тело запроса
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_json(raw) -> Any:
+    """
+    Разбирает JSON ответа (orjson, если установлен, иначе стандартный json)
+
+    :param raw: Текст или байты JSON
+    :return: Разобранные данные
+    :raises json.JSONDecodeError: При некорректном JSON (orjson.JSONDecodeError - его подкласс)
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# Общая HTTP-сессия для запросов к OpenRouter: keep-alive соединения переиспользуются
+# между этапами интерпретации и между пользователями, без нового TCP/TLS-рукопожатия
+OPENROUTER_CONNECTION_LIMIT = 64
+_http_session: Optional[aiohttp.ClientSession] = None
+_http_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_http_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую HTTP-сессию, создавая её при первом обращении
+
+    Сессия привязана к event loop бота. send_request_sync работает в своём loop
+    и использует собственную краткоживущую сессию, а не эту.
+
+    :return: Сессия aiohttp
+    """
+    global _http_session, _http_session_loop
+    loop = asyncio.get_running_loop()
+    if _http_session is None or _http_session.closed or _http_session_loop is not loop:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=OPENROUTER_CONNECTION_LIMIT, ttl_dns_cache=300)
+        )
+        _http_session_loop = loop
+    return _http_session
+
+
+async def close_http_session():
+    """Закрывает общую HTTP-сессию (при остановке бота)"""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
 @retry(
     wait=wait_random_exponential(min=1, max=300),
     stop=stop_after_attempt(5),
@@ -143,7 +262,9 @@ async def send_request(
     api_key: str,
     max_retries: int = 5,
     max_tokens: int = 4000,
-    temperature: float = 0.3
+    temperature: float = 0.3,
+    cache_breakpoints: Sequence[int] = (),
+    session: Optional[aiohttp.ClientSession] = None
 ) -> str:
     """
     Отправляет запрос к OpenRouter API с повторными попытками
@@ -154,6 +275,8 @@ async def send_request(
     :param max_retries: Максимальное количество повторов (не используется, управляется @retry)
     :param max_tokens: Максимальное количество токенов в ответе
     :param temperature: Температура генерации (0.0-1.0)
+    :param cache_breakpoints: Индексы сообщений с явной точкой кэширования промпта
+    :param session: HTTP-сессия для запроса (по умолчанию - общая сессия бота)
     :return: Текст ответа от модели
     :raises OpenRouterError: При ошибках API или пустом ответе
     """
@@ -168,7 +291,7 @@ async def send_request(
         raise ValueError("Список сообщений не может быть пустым")
     
     # Конвертируем сообщения
-    converted_messages = _convert_messages(messages)
+    converted_messages = _convert_messages(messages, cache_breakpoints)
     
     # Подготовка данных
     payload = {
@@ -187,44 +310,143 @@ async def send_request(
     
     timeout = aiohttp.ClientTimeout(total=300)
     
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        try:
-            async with session.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                json=payload,
-                headers=headers
-            ) as response:
-                
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise OpenRouterError(f"HTTP {response.status}: {error_text}")
-                
+    if session is None:
+        session = _get_http_session()
+    try:
+        async with session.post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            data=_encode_payload(payload),
+            headers=headers,
+            timeout=timeout
+        ) as response:
+            
+            if response.status != 200:
+                error_text = await response.text()
+                raise OpenRouterError(f"HTTP {response.status}: {error_text}")
+            
+            try:
+                data = _decode_json(await response.read())
+            except json.JSONDecodeError as e:
+                raise OpenRouterError(f"Ошибка парсинга JSON: {e}")
+            
+            # Проверяем структуру ответа
+            if not data.get('choices') or len(data['choices']) == 0:
+                raise OpenRouterError("Пустой ответ от API - отсутствуют choices")
+            
+            # Извлекаем контент
+            content = data['choices'][0].get('message', {}).get('content')
+            
+            # КРИТИЧЕСКАЯ ПРОВЕРКА: контент не должен быть пустым
+            if content is None or (isinstance(content, str) and content.strip() == ""):
+                provider = data.get('provider', 'unknown')
+                usage = data.get('usage', {})
+                usage_info = f", tokens: {usage.get('completion_tokens', 0)}/{usage.get('prompt_tokens', 0)}"
+                error_msg = f"Получен пустой ответ от провайдера {provider}{usage_info}"
+                raise OpenRouterError(error_msg)
+            
+            return content.strip()
+            
+    except aiohttp.ClientError as e:
+        raise OpenRouterError(f"Ошибка соединения: {e}")
+    except asyncio.TimeoutError:
+        raise OpenRouterError("Превышен таймаут запроса")
+
+
+async def send_request_stream(
+    messages: List[Dict[str, Any]],
+    model: str,
+    api_key: str,
+    max_tokens: int = 4000,
+    temperature: float = 0.3,
+    cache_breakpoints: Sequence[int] = ()
+) -> AsyncIterator[str]:
+    """
+    Отправляет запрос к OpenRouter API в режиме стриминга (stream=True)
+
+    Повторные попытки здесь не выполняются: после выдачи части ответа повтор
+    привёл бы к дублированию текста. Решение о повторе принимает вызывающий код.
+
+    :param messages: Список сообщений [{"role": "user/system/assistant", "content": "текст"}]
+    :param model: Название модели
+    :param api_key: API ключ OpenRouter
+    :param max_tokens: Максимальное количество токенов в ответе
+    :param temperature: Температура генерации (0.0-1.0)
+    :param cache_breakpoints: Индексы сообщений с явной точкой кэширования промпта
+    :return: Асинхронный генератор фрагментов текста ответа
+    :raises OpenRouterError: При ошибках API или разрыве соединения
+    """
+
+    if not api_key:
+        raise ValueError("API ключ обязателен")
+
+    if not model or '/' not in model:
+        raise ValueError(f"Некорректное название модели: {model}")
+
+    if not messages:
+        raise ValueError("Список сообщений не может быть пустым")
+
+    payload = {
+        "model": model,
+        "messages": _convert_messages(messages, cache_breakpoints),
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": True
+    }
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://tarot-bot.com",
+        "X-Title": "Personal Tarot Bot"
+    }
+
+    # Общий таймаут как у обычного запроса, плюс ограничение на паузу между фрагментами
+    timeout = aiohttp.ClientTimeout(total=300, sock_read=60)
+
+    session = _get_http_session()
+    try:
+        async with session.post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            data=_encode_payload(payload),
+            headers=headers,
+            timeout=timeout
+        ) as response:
+
+            if response.status != 200:
+                error_text = await response.text()
+                raise OpenRouterError(f"HTTP {response.status}: {error_text}")
+
+            # Ответ приходит в формате SSE: строки "data: {...}", завершение - "data: [DONE]".
+            # Строки-комментарии (": OPENROUTER PROCESSING") и пустые строки пропускаем
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+
+                data_str = line[5:].strip()
+                if data_str == '[DONE]':
+                    return
+
                 try:
-                    data = await response.json()
+                    data = _decode_json(data_str)
                 except json.JSONDecodeError as e:
                     raise OpenRouterError(f"Ошибка парсинга JSON: {e}")
-                
-                # Проверяем структуру ответа
-                if not data.get('choices') or len(data['choices']) == 0:
-                    raise OpenRouterError("Пустой ответ от API - отсутствуют choices")
-                
-                # Извлекаем контент
-                content = data['choices'][0].get('message', {}).get('content')
-                
-                # КРИТИЧЕСКАЯ ПРОВЕРКА: контент не должен быть пустым
-                if content is None or (isinstance(content, str) and content.strip() == ""):
-                    provider = data.get('provider', 'unknown')
-                    usage = data.get('usage', {})
-                    usage_info = f", tokens: {usage.get('completion_tokens', 0)}/{usage.get('prompt_tokens', 0)}"
-                    error_msg = f"Получен пустой ответ от провайдера {provider}{usage_info}"
-                    raise OpenRouterError(error_msg)
-                
-                return content.strip()
-                
-        except aiohttp.ClientError as e:
-            raise OpenRouterError(f"Ошибка соединения: {e}")
-        except asyncio.TimeoutError:
-            raise OpenRouterError("Превышен таймаут запроса")
+
+                if 'error' in data:
+                    raise OpenRouterError(f"Ошибка в потоке ответа: {data['error']}")
+
+                choices = data.get('choices') or []
+                if not choices:
+                    continue
+
+                delta = choices[0].get('delta', {}).get('content')
+                if delta:
+                    yield delta
+
+    except aiohttp.ClientError as e:
+        raise OpenRouterError(f"Ошибка соединения: {e}")
+    except asyncio.TimeoutError:
+        raise OpenRouterError("Превышен таймаут запроса")
 
 
 def send_request_sync(
@@ -253,10 +475,30 @@ def send_request_sync(
         asyncio.set_event_loop(loop)
     
     return loop.run_until_complete(
-        send_request(messages, model, api_key, max_retries, max_tokens, temperature)
+        _send_request_own_session(messages, model, api_key, max_retries, max_tokens, temperature)
     )
 
 
+async def _send_request_own_session(
+    messages: List[Dict[str, Any]],
+    model: str,
+    api_key: str,
+    max_retries: int,
+    max_tokens: int,
+    temperature: float
+) -> str:
+    """
+    Отправляет запрос через отдельную HTTP-сессию, закрываемую после ответа
+
+    Общая сессия привязана к event loop бота, а send_request_sync работает в своём loop.
+
+    :return: Текст ответа от модели
+    """
+    async with aiohttp.ClientSession() as session:
+        return await send_request(messages, model, api_key, max_retries, max_tokens, temperature,
+                                  session=session)
+
+
 class TarotLLMAgent:
     """
     Упрощенный агент для работы с OpenRouter API для таро-бота
@@ -264,7 +506,7 @@ class TarotLLMAgent:
     """
     
     def __init__(self, model_name: str, api_key: str, task_prompt: str = None, 
-                 max_tokens: int = 4000, temperature: float = 0.7):
+                 max_tokens: int = 4000, temperature: float = 0.7, use_response_cache: bool = True):
         """
         Инициализирует агент для работы с таро
         
@@ -273,6 +515,7 @@ class TarotLLMAgent:
         :param task_prompt: Системный промпт (например: "Ты опытный таролог...")
         :param max_tokens: Максимальное количество токенов в ответе
         :param temperature: Температура генерации
+        :param use_response_cache: Отдавать повторы того же запроса из дискового кэша ответов
         """
         # Пропускаем валидацию для тестовых моделей
         if not model_name.startswith("test-") and '/' not in model_name:
@@ -285,6 +528,7 @@ class TarotLLMAgent:
         self.api_key = api_key
         self.max_tokens = max_tokens
         self.temperature = temperature
+        self.use_response_cache = use_response_cache
         self.context = MessageContext(task_prompt)
     
     def response_from_LLM(self, user_message: str) -> str:
@@ -333,6 +577,24 @@ class TarotLLMAgent:
         """
         self.context.update_task_prompt(new_task_prompt)
     
+    def _cache_breakpoints(self, context: MessageContext) -> Tuple[int, ...]:
+        """
+        Выбирает сообщения, на которых ставятся точки кэширования промпта
+        
+        Точки ставятся на концах неизменных частей (персона, контекст расклада с картами)
+        и на последнем сообщении: следующий этап сессии продолжает ту же историю
+        и получает её обработку из кэша провайдера
+        
+        :param context: MessageContext с историей сообщений
+        :return: Индексы сообщений (пустой кортеж, если модель кэширует префикс сама)
+        """
+        if not uses_explicit_prompt_cache(self.model_name) or not context.messages:
+            return ()
+        
+        # Провайдеры принимают не больше MAX_CACHE_BREAKPOINTS точек - берём самые поздние
+        breakpoints = {len(context.messages) - 1, *context.cache_prefix_indices}
+        return tuple(sorted(breakpoints)[-MAX_CACHE_BREAKPOINTS:])
+    
     def get_message_count(self) -> int:
         """
         Возвращает количество сообщений в контексте
@@ -357,19 +619,87 @@ class TarotLLMAgent:
             
             # Используем глобальную асинхронную функцию send_request
             from src.openrouter_client import send_request as async_send_request
+            from src.llm_cache import get_llm_cache
             
             messages = context.get_message_history()
             
+            # Повтор того же запроса (ретраи, перезапуски) отдаём из кэша без обращения к API
+            cache = get_llm_cache() if self.use_response_cache else None
+            if cache is not None:
+                cache_key = cache.make_key(self.model_name, messages, self.max_tokens, self.temperature)
+                cached = await cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
             response = await async_send_request(
                 messages=messages,
                 model=self.model_name,
                 api_key=self.api_key,
                 max_tokens=self.max_tokens,
-                temperature=self.temperature
+                temperature=self.temperature,
+                cache_breakpoints=self._cache_breakpoints(context)
             )
             
+            if cache is not None:
+                await cache.set(cache_key, response)
+            
             return response
             
         except Exception as e:
             error_msg = f"Ошибка при получении ответа от LLM: {str(e)}"
             raise OpenRouterError(error_msg)
+    
+    async def send_request_stream(self, context: MessageContext) -> AsyncIterator[str]:
+        """
+        Потоковый вариант send_request: отдаёт ответ по мере генерации
+        
+        Если поток оборвался до первого фрагмента, запрос повторяется обычным
+        send_request с ретраями. Полный ответ сохраняется в кэш, а ответ из кэша
+        отдаётся одним фрагментом.
+        
+        :param context: MessageContext с историей сообщений
+        :return: Асинхронный генератор фрагментов ответа
+        """
+        # Для тестовых моделей отдаём мок-ответ одним фрагментом
+        if self.model_name.startswith("test-"):
+            yield await self.send_request(context)
+            return
+        
+        from src.llm_cache import get_llm_cache
+        
+        messages = context.get_message_history()
+        
+        cache = get_llm_cache() if self.use_response_cache else None
+        if cache is not None:
+            cache_key = cache.make_key(self.model_name, messages, self.max_tokens, self.temperature)
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        try:
+            async for delta in send_request_stream(
+                messages=messages,
+                model=self.model_name,
+                api_key=self.api_key,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                cache_breakpoints=self._cache_breakpoints(context)
+            ):
+                chunks.append(delta)
+                yield delta
+        except Exception as e:
+            if chunks:
+                raise OpenRouterError(f"Ошибка при получении ответа от LLM: {str(e)}")
+            # Ничего ещё не отдано - можно безопасно повторить обычным запросом
+            yield await self.send_request(context)
+            return
+        
+        response = "".join(chunks).strip()
+        if not response:
+            yield await self.send_request(context)
+            return
+        
+        if cache is not None:
+            await cache.set(cache_key, response)
@@ -4,6 +4,7 @@
 
 import asyncio
 import logging
+import math
 from typing import Optional
 from telegram import Message
 from telegram.ext import ContextTypes
@@ -143,6 +144,46 @@ class InterpretationProgress:
         self.current_stage = 0
         self.update_context = None  # Для создания новых прогресс-баров
         
+    # Минимальный интервал между обновлениями прогресс-бара по мере стриминга ответа
+    STREAM_UPDATE_INTERVAL = 1.5
+    # Характерный объём ответа этапа в символах для оценки доли выполнения
+    STREAM_EXPECTED_CHARS = 4000
+    
+    def stream_reporter(self, start: int, end: int):
+        """
+        Создаёт обработчик частичного ответа LLM, двигающий прогресс-бар от start к end
+        
+        Длина ответа заранее неизвестна, поэтому доля выполнения оценивается
+        асимптотически: прогресс растёт с каждым фрагментом, но не доходит до end,
+        который выставляет завершение этапа. Пока анимация начала этапа не довела
+        бар до start, обновления пропускаются, чтобы прогресс не шёл назад.
+        
+        :param start: Процент, с которого начинается стриминг этапа
+        :param end: Процент завершения этапа
+        :return: Корутина-обработчик, принимающая накопленный текст ответа
+        """
+        last_update = 0.0
+        
+        async def report(response: str):
+            nonlocal last_update
+            progress_bar = self.progress_bar
+            if progress_bar.current_progress < start:
+                return
+            
+            loop = asyncio.get_running_loop()
+            if loop.time() - last_update < self.STREAM_UPDATE_INTERVAL:
+                return
+            
+            share = 1 - math.exp(-len(response) / self.STREAM_EXPECTED_CHARS)
+            progress = start + int((end - 1 - start) * share)
+            if progress <= progress_bar.current_progress:
+                return
+            
+            last_update = loop.time()
+            await progress_bar.update_progress(progress, delay=0)
+        
+        return report
+    
     async def start_image_generation(self):
         """Этап 1: 0-25% - Генерация изображения расклада"""
         await self.progress_bar.update_progress(0)
@@ -251,6 +292,16 @@ class InterpretationProgress:
             await asyncio.sleep(0.3)
             self.current_stage = 4
     
+    async def complete_combined_analysis(self):
+        """Завершение этапов 2-3, выполненных одним запросом (анализ и синтез)"""
+        if self.current_stage == 2:
+            # Пересоздаем прогресс-бар внизу на 75%
+            recreated = await self.recreate_progress_bar(75)
+            if not recreated:
+                await self.progress_bar.update_progress(75)
+            await asyncio.sleep(0.3)
+            self.current_stage = 4
+    
     async def start_final_interpretation(self):
         """Этап 4: 75-100% - Промпт 06 (финальная интерпретация)"""
         if self.current_stage == 4:
@@ -264,6 +315,12 @@ class InterpretationProgress:
             await self.progress_bar.update_progress(100)
             self.current_stage = 5
     
+    async def complete_single_request(self):
+        """Завершение этапов 2-4, выполненных одним запросом"""
+        if self.current_stage == 2:
+            await self.progress_bar.update_progress(100)
+            self.current_stage = 5
+    
     async def finish(self, delay: float = 1.5):
         """Завершает весь процесс"""
         await self.progress_bar.complete(delay=delay)
@@ -15,6 +15,9 @@ class PromptManager:
         self.tarot_cards_file = tarot_cards_file
         self._prompt_cache = {}
         self._cards_data = None
+        # Индекс карт по имени и готовые описания карт без позиции: имя -> текст
+        self._cards_by_name = None
+        self._card_snippets = {}
     
     def _load_prompt(self, filename: str) -> str:
         """Загружает промпт из файла с кешированием"""
@@ -29,36 +32,85 @@ class PromptManager:
         if self._cards_data is None:
             with open(self.tarot_cards_file, 'r', encoding='utf-8') as f:
                 self._cards_data = json.load(f)
+            # При совпадении имён остаётся первая карта, как при линейном поиске
+            self._cards_by_name = {}
+            for card in self._cards_data.get('cards', []):
+                self._cards_by_name.setdefault(card.get('name'), card)
+            # Описание карты не зависит от пользователя и позиции - рендерим один раз при загрузке,
+            # чтобы одинаковые карты давали побайтно одинаковый текст промпта
+            self._card_snippets = {
+                name: self._render_card_snippet(card)
+                for name, card in self._cards_by_name.items()
+            }
     
-    def get_system_persona(self, name: str, age: int) -> str:
-        """Загружает системный промпт с подстановкой данных пользователя"""
-        prompt = self._load_prompt('01_system_persona.md')
+    @staticmethod
+    def _render_card_snippet(card_data: Dict) -> str:
+        """Форматирует описание карты (без заголовка с позицией)"""
+        fortune_telling = " • ".join(card_data.get('fortune_telling', []))
+        keywords = ", ".join(card_data.get('keywords', []))
+        
+        # Выбираем несколько значений из meanings для контекста
+        light_meanings = card_data.get('meanings', {}).get('light', [])[:3]
+        shadow_meanings = card_data.get('meanings', {}).get('shadow', [])[:3]
+        
+        return f"""• Предсказания: {fortune_telling}
+• Ключевые слова: {keywords}
+• Светлые аспекты: {" • ".join(light_meanings)}
+• Теневые аспекты: {" • ".join(shadow_meanings)}"""
+    
+    def preload(self):
+        """Заранее загружает данные карт и все промпты каталога (при запуске бота)"""
+        self._load_cards_data()
+        for filename in sorted(os.listdir(self.prompts_dir)):
+            if filename.endswith('.md'):
+                self._load_prompt(filename)
+    
+    def reload(self):
+        """Сбрасывает кэши промптов и данных карт (после правки файлов без перезапуска)"""
+        self._prompt_cache.clear()
+        self._cards_data = None
+        self._cards_by_name = None
+        self._card_snippets = {}
+    
+    def get_system_persona(self) -> str:
+        """
+        Загружает системный промпт персоны
+        
+        Текст одинаков для всех пользователей, поэтому провайдер может кэшировать его
+        обработку между сессиями. Данные пользователя - в get_user_profile
+        """
+        return self._load_prompt('01_system_persona.md')
+    
+    def get_user_profile(self, name: str, age: int) -> str:
+        """Формирует системное сообщение с данными пользователя и текущей датой"""
         current_date = datetime.now().strftime("%d %B %Y года")
         
-        # Подставляем данные пользователя
-        formatted_prompt = f"""Имя пользователя: {name}
+        return f"""Имя пользователя: {name}
 Возраст: {age} лет
-Текущая дата: {current_date}
-
-{prompt}"""
-        
-        return formatted_prompt
+Текущая дата: {current_date}"""
     
     def get_spread_context(self, spread_type: str, selected_cards: List[Dict], positions: List[str]) -> str:
         """Загружает контекст конкретного расклада с картами"""
-        filename = f"02_{spread_type}_context.md"
-        prompt = self._load_prompt(filename)
+        return f"""{self.get_spread_template(spread_type)}
+
+{self.get_spread_cards_block(selected_cards, positions)}"""
+    
+    def get_spread_template(self, spread_type: str) -> str:
+        """
+        Загружает описание расклада без выпавших карт
         
-        # Форматируем информацию о картах
+        Текст одинаков для всех раскладов этого типа, поэтому вместе с персоной
+        образует общий для пользователей кэшируемый префикс промпта
+        """
+        return self._load_prompt(f"02_{spread_type}_context.md")
+    
+    def get_spread_cards_block(self, selected_cards: List[Dict], positions: List[str]) -> str:
+        """Форматирует блок с выпавшими картами расклада"""
         cards_info = self._format_cards_for_prompt(selected_cards, positions)
         
-        formatted_prompt = f"""{prompt}
-
-## ВЫПАВШИЕ КАРТЫ В ВАШЕМ РАСКЛАДЕ
+        return f"""## ВЫПАВШИЕ КАРТЫ В ВАШЕМ РАСКЛАДЕ
 
 {cards_info}"""
-        
-        return formatted_prompt
     
     def _format_cards_for_prompt(self, selected_cards: List[Dict], positions: List[str]) -> str:
         """Форматирует карты для промпта"""
@@ -68,25 +120,11 @@ class PromptManager:
         for i, card in enumerate(selected_cards):
             position = positions[i] if i < len(positions) else f"Позиция {i+1}"
             
-            # Находим полную информацию о карте
-            card_data = self._find_card_by_name(card['name'])
-            if not card_data:
+            snippet = self._card_snippets.get(card['name'])
+            if snippet is None:
                 continue
-                
-            fortune_telling = " • ".join(card_data.get('fortune_telling', []))
-            keywords = ", ".join(card_data.get('keywords', []))
-            
-            # Выбираем несколько значений из meanings для контекста
-            light_meanings = card_data.get('meanings', {}).get('light', [])[:3]
-            shadow_meanings = card_data.get('meanings', {}).get('shadow', [])[:3]
-            
-            card_info = f"""**{position}: {card['name']}**
-• Предсказания: {fortune_telling}
-• Ключевые слова: {keywords}
-• Светлые аспекты: {" • ".join(light_meanings)}
-• Теневые аспекты: {" • ".join(shadow_meanings)}"""
             
-            cards_info.append(card_info)
+            cards_info.append(f"**{position}: {card['name']}**\n{snippet}")
         
         return "\n\n".join(cards_info)
     
@@ -95,10 +133,7 @@ class PromptManager:
         if not self._cards_data:
             return None
             
-        for card in self._cards_data.get('cards', []):
-            if card.get('name') == name:
-                return card
-        return None
+        return self._cards_by_name.get(name)
     
     def get_psychological_analysis_prompt(self, user_answers: List[str]) -> str:
         """Загружает промпт для психологического анализа с ответами пользователя"""
@@ -129,6 +164,78 @@ class PromptManager:
         """Загружает промпт для глубокого синтеза и планирования рассказа"""
         return self._load_prompt('05_deep_synthesis_and_story_planning.md')
     
+    def get_combined_analysis_synthesis_prompt(self) -> str:
+        """
+        Промпт синтеза для объединённого запроса этапов 2-3
+        
+        Отправляется сразу после промпта анализа контекста: модель выполняет оба задания
+        и размечает результаты маркерами, по которым сессия разделяет ответ
+        """
+        # Текст не зависит от пользователя - собираем один раз, все сессии ссылаются на одну строку
+        cache_key = 'combined:analysis_synthesis'
+        if cache_key in self._prompt_cache:
+            return self._prompt_cache[cache_key]
+        
+        synthesis_prompt = self.get_synthesis_prompt()
+        
+        self._prompt_cache[cache_key] = f"""Выполни два задания подряд в одном ответе: сначала анализ контекста и интерпретацию карт
+из предыдущего сообщения, затем глубокий синтез по заданию ниже, опираясь на свой анализ.
+
+{synthesis_prompt}
+
+## ФОРМАТ ОТВЕТА
+
+[CONTEXT_ANALYSIS]
+(полный результат анализа контекста и интерпретации карт)
+[/CONTEXT_ANALYSIS]
+
+[SYNTHESIS]
+(полный результат глубокого синтеза и плана рассказа)
+[/SYNTHESIS]"""
+        return self._prompt_cache[cache_key]
+    
+    def get_single_request_interpretation_prompt(self) -> str:
+        """
+        Промпт синтеза и финального ответа для единого запроса этапов 2-4
+        
+        Отправляется сразу после промпта анализа контекста: модель выполняет все три
+        задания в одном ответе. Анализ и синтез размечаются так же, как в объединённом
+        запросе этапов 2-3, финальный текст - маркерами интерпретации из промпта 06
+        """
+        cache_key = 'combined:single_request'
+        if cache_key in self._prompt_cache:
+            return self._prompt_cache[cache_key]
+        
+        synthesis_prompt = self.get_synthesis_prompt()
+        final_prompt = self.get_final_response_prompt()
+        
+        self._prompt_cache[cache_key] = f"""Выполни три задания подряд в одном ответе: сначала анализ контекста и интерпретацию карт
+из предыдущего сообщения, затем глубокий синтез, затем финальный ответ пользователю.
+Каждое следующее задание опирается на результаты предыдущих.
+
+# ЗАДАНИЕ 2: ГЛУБОКИЙ СИНТЕЗ
+
+{synthesis_prompt}
+
+# ЗАДАНИЕ 3: ФИНАЛЬНЫЙ ОТВЕТ
+
+{final_prompt}
+
+## ФОРМАТ ОТВЕТА
+
+[CONTEXT_ANALYSIS]
+(полный результат анализа контекста и интерпретации карт)
+[/CONTEXT_ANALYSIS]
+
+[SYNTHESIS]
+(полный результат глубокого синтеза и плана рассказа)
+[/SYNTHESIS]
+
+[INTERPRETATION_START]
+(финальная интерпретация для пользователя)
+[INTERPRETATION_END]"""
+        return self._prompt_cache[cache_key]
+    
     def get_final_response_prompt(self) -> str:
         """Загружает промпт для финального ответа пользователю"""
         return self._load_prompt('06_final_user_response.md')
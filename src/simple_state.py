@@ -129,6 +129,51 @@ def update_data(chat_id: int, key: str, value: Any) -> None:
     logger.info(f"Пользователь {chat_id}: обновлены данные {key} = {value}")
 
 
+def update_data_many(chat_id: int, **values: Any) -> None:
+    """
+    Обновляет несколько ключей в данных пользователя за одно обращение
+    
+    :param chat_id: ID чата пользователя
+    :param values: Пары ключ=значение для обновления
+    
+    Примеры использования:
+    >>> update_data_many(123456, current_llm_question=0, llm_answers=[])
+    """
+    if chat_id not in _user_states:
+        _user_states[chat_id] = {
+            'state': UserState.IDLE,
+            'data': {},
+            'timestamp': datetime.now()
+        }
+    
+    _user_states[chat_id]['data'].update(values)
+    
+    # Обновляем timestamp
+    _user_states[chat_id]['timestamp'] = datetime.now()
+    
+    logger.info(f"Пользователь {chat_id}: обновлены данные {', '.join(values)}")
+
+
+def remove_data(chat_id: int, *keys: str) -> None:
+    """
+    Удаляет ключи из данных пользователя (отсутствующие ключи пропускаются)
+    
+    :param chat_id: ID чата пользователя
+    :param keys: Ключи для удаления
+    
+    Примеры использования:
+    >>> remove_data(123456, 'llm_session', 'progress_manager')
+    """
+    if chat_id not in _user_states:
+        return
+    
+    data = _user_states[chat_id]['data']
+    for key in keys:
+        data.pop(key, None)
+    
+    logger.info(f"Пользователь {chat_id}: удалены данные {', '.join(keys)}")
+
+
 def clear_state(chat_id: int) -> None:
     """
     Очищает состояние и данные пользователя
@@ -2,6 +2,7 @@
 Конфигурации раскладов Таро на основе исследования схем
 """
 import math
+from functools import lru_cache
 from typing import List, Dict, Tuple
 
 
@@ -220,10 +221,14 @@ SPREAD_CONFIGS = {
 }
 
 
+@lru_cache(maxsize=None)
 def get_spread_config(spread_name: str) -> Dict:
     """
     Получить конфигурацию расклада по названию
     
+    Копия конфигурации создаётся один раз на расклад и переиспользуется
+    всеми вызовами - не изменяйте возвращаемый словарь.
+    
     :param spread_name: Название расклада
     :return: Конфигурация расклада
     """
@@ -5,8 +5,9 @@
 import json
 import os
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,6 +18,18 @@ class SpreadLogger:
     def __init__(self, logs_dir: str = "logs/spreads"):
         self.logs_dir = logs_dir
         self._ensure_logs_directory()
+        # Обновление лога - чтение, изменение и перезапись файла, поэтому записи
+        # выполняются одним фоновым потоком строго в порядке поступления
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spread-log")
+    
+    def submit(self, method: Callable, *args, **kwargs) -> Future:
+        """
+        Выполняет метод логгера в фоновом потоке записи, не блокируя event loop
+        
+        :param method: Метод этого логгера (например, self.complete_interpretation)
+        :return: Future с результатом метода (для create_spread_log - путь к файлу)
+        """
+        return self._writer.submit(method, *args, **kwargs)
     
     def _ensure_logs_directory(self):
         """Создает директорию для логов если не существует"""
@@ -6,7 +6,7 @@ import json
 import os
 import threading
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,7 +16,8 @@ DATA_DIR = "data"
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 
 # Блокировка для потокобезопасного доступа к файлу
-_file_lock = threading.Lock()
+# (реентерабельная, чтобы составные операции могли удерживать её целиком)
+_file_lock = threading.RLock()
 
 
 def init_storage() -> bool:
@@ -228,22 +229,7 @@ def get_user(user_id: int = None, chat_id: int = None) -> Optional[Dict[str, Any
                     break
         
         if user_data:
-            # Добавляем вычисленный возраст
-            user_copy = user_data.copy()
-            if 'birthdate' in user_copy:
-                try:
-                    from datetime import date
-                    birth_date = date.fromisoformat(user_copy['birthdate'])
-                    today = date.today()
-                    age = today.year - birth_date.year
-                    if (today.month, today.day) < (birth_date.month, birth_date.day):
-                        age -= 1
-                    user_copy['age'] = age
-                except Exception as e:
-                    logger.warning(f"Ошибка вычисления возраста для user_id={user_id}, chat_id={chat_id}: {e}")
-                    user_copy['age'] = None
-            
-            return user_copy
+            return _with_age(user_data, user_id=user_id, chat_id=chat_id)
         
         return None
         
@@ -252,6 +238,32 @@ def get_user(user_id: int = None, chat_id: int = None) -> Optional[Dict[str, Any
         return None
 
 
+def _with_age(user_data: Dict[str, Any], user_id: int = None, chat_id: int = None) -> Dict[str, Any]:
+    """
+    Возвращает копию данных пользователя с вычисленным возрастом
+    
+    :param user_data: Данные пользователя из хранилища
+    :param user_id: ID пользователя (для логов)
+    :param chat_id: ID чата (для логов)
+    :return: Копия данных с полем 'age'
+    """
+    user_copy = user_data.copy()
+    if 'birthdate' in user_copy:
+        try:
+            from datetime import date
+            birth_date = date.fromisoformat(user_copy['birthdate'])
+            today = date.today()
+            age = today.year - birth_date.year
+            if (today.month, today.day) < (birth_date.month, birth_date.day):
+                age -= 1
+            user_copy['age'] = age
+        except Exception as e:
+            logger.warning(f"Ошибка вычисления возраста для user_id={user_id}, chat_id={chat_id}: {e}")
+            user_copy['age'] = None
+    
+    return user_copy
+
+
 def get_user_credits(user_id: int) -> Optional[Dict[str, int]]:
     """
     Возвращает количество кредитов пользователя по тарифам
@@ -311,6 +323,54 @@ def use_credit(user_id: int, tariff: str) -> bool:
         return False
 
 
+def fetch_user_and_debit(user_id: int, tariff: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    Загружает пользователя и списывает кредит с тарифа за одно чтение хранилища
+    Заменяет последовательность user_exists/has_credits/use_credit/get_user
+    
+    :param user_id: ID пользователя Telegram
+    :param tariff: Тариф ('beginner' или 'expert')
+    :return: (True, данные) если кредит списан; (False, данные) если кредитов нет
+             или списание не удалось; (False, None) если пользователь не найден
+    :raises Exception: При ошибке чтения хранилища - чтобы её нельзя было спутать
+                       с отсутствием пользователя
+    
+    Примеры использования:
+    >>> ok, user = fetch_user_and_debit(987654, 'beginner')
+    >>> if user is None:
+    ...     print("Новый пользователь")
+    """
+    try:
+        with _file_lock:
+            users = _load_users()
+            user_key = str(user_id)
+            
+            if user_key not in users:
+                return False, None
+            
+            user_data = users[user_key]
+            credits = user_data.get('credits', {'beginner': 0, 'expert': 0})
+            
+            if credits.get(tariff, 0) <= 0:
+                logger.warning(f"Недостаточно кредитов на тарифе {tariff} для пользователя {user_id}")
+                return False, _with_age(user_data, user_id=user_id)
+            
+            # Списываем кредит
+            credits[tariff] -= 1
+            user_data['credits'] = credits
+            
+            if not _save_users(users):
+                credits[tariff] += 1
+                return False, _with_age(user_data, user_id=user_id)
+        
+        logger.info(f"Списан кредит с тарифа {tariff} для пользователя {user_id}. Осталось: {credits[tariff]}")
+        return True, _with_age(user_data, user_id=user_id)
+        
+    except Exception as e:
+        logger.error(f"Ошибка списания кредита для пользователя {user_id}: {e}")
+        raise
+
+
 def has_credits(user_id: int, tariff: str) -> bool:
     """
     Проверяет наличие кредитов на указанном тарифе
@@ -165,11 +165,52 @@ def test_valid_config():
             os.chdir(original_dir)
 
 
+def test_config_cached_until_file_changes():
+    """
+    Тестируем, что конфигурация не перечитывается, пока файл не изменён
+    """
+    print("\n🧪 Тест: повторная загрузка берёт конфигурацию из кэша")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original_dir = os.getcwd()
+        
+        try:
+            os.chdir(temp_dir)
+            
+            test_config = {
+                "telegram_bot_token": "123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11",
+                "openrouter_api_key": "sk-or-v1-test-key",
+                "model_name": "deepseek/deepseek-chat-v3-0324:free",
+                "max_message_length": 4096
+            }
+            
+            with open("config.json", "w", encoding="utf-8") as f:
+                json.dump(test_config, f, ensure_ascii=False)
+            
+            first = load_config()
+            assert load_config() is first
+            
+            # Изменённый файл загружается заново
+            test_config["max_message_length"] = 2048
+            with open("config.json", "w", encoding="utf-8") as f:
+                json.dump(test_config, f, ensure_ascii=False, indent=4)
+            
+            second = load_config()
+            assert second is not first
+            assert second["max_message_length"] == 2048
+            
+            print("✅ УСПЕХ: Кэш конфигурации работает")
+            return True
+        
+        finally:
+            os.chdir(original_dir)
+
+
 if __name__ == "__main__":
     print("🚀 Запуск тестов для config.py\n")
     
     tests_passed = 0
-    total_tests = 3
+    total_tests = 4
     
     # Запускаем тесты
     if test_empty_token_error():
@@ -181,6 +222,9 @@ if __name__ == "__main__":
     if test_valid_config():
         tests_passed += 1
     
+    if test_config_cached_until_file_changes():
+        tests_passed += 1
+    
     # Выводим результаты
     print(f"\n📊 Результаты тестов: {tests_passed}/{total_tests}")
     
@@ -0,0 +1,73 @@
+"""
+Тесты для дискового кэша ответов LLM
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к src для импорта модулей
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.llm_cache import LLMResponseCache
+
+
+def test_cache_roundtrip_and_key():
+    """Ответ сохраняется по ключу, а другой контекст даёт другой ключ"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(cache_dir=tmp_dir)
+        messages = [{"role": "user", "content": [{"type": "text", "text": "Привет"}]}]
+        key = cache.make_key("test/model", messages, 4000, 0.3)
+        
+        assert key == cache.make_key("test/model", list(messages), 4000, 0.3)
+        assert key != cache.make_key("test/model", messages, 4000, 0.7)
+        
+        assert asyncio.run(cache.get(key)) is None
+        asyncio.run(cache.set(key, "Ответ"))
+        assert asyncio.run(cache.get(key)) == "Ответ"
+        assert cache.stats == {"hits": 1, "misses": 1}
+
+
+def test_cache_ttl_expired():
+    """Устаревшая запись не возвращается"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(cache_dir=tmp_dir, ttl_seconds=0)
+        asyncio.run(cache.set("abc", "Ответ"))
+        os.utime(os.path.join(tmp_dir, "abc.json"), (0, 0))
+        
+        assert asyncio.run(cache.get("abc")) is None
+        assert not os.path.exists(os.path.join(tmp_dir, "abc.json"))
+
+
+def test_cache_evicts_oldest_over_size_limit():
+    """При превышении лимита размера удаляются самые старые записи"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(cache_dir=tmp_dir)
+        now = time.time()
+        for i in range(3):
+            asyncio.run(cache.set(f"key{i}", "x" * 60))
+            # Свежие mtime: записи не устарели по TTL, удалить их может только вытеснение
+            os.utime(os.path.join(tmp_dir, f"key{i}.json"), (now - 100 + i, now - 100 + i))
+        
+        # Лимит вмещает три записи, четвёртая запускает вытеснение
+        entry_size = os.path.getsize(os.path.join(tmp_dir, "key0.json"))
+        cache.max_size_bytes = int(entry_size * 3.5)
+        asyncio.run(cache.set("key3", "x" * 60))
+        
+        assert not os.path.exists(os.path.join(tmp_dir, "key0.json"))
+        total_size = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+        assert total_size <= cache.max_size_bytes
+        assert asyncio.run(cache.get("key1")) == "x" * 60
+        assert asyncio.run(cache.get("key3")) == "x" * 60
+
+
+def test_cache_overwrite_keeps_size_accurate():
+    """Перезапись ключа не увеличивает учтённый размер кэша и не оставляет временных файлов"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(cache_dir=tmp_dir)
+        for _ in range(3):
+            asyncio.run(cache.set("abc", "x" * 1000))
+        
+        assert os.listdir(tmp_dir) == ["abc.json"]
+        assert cache._size_bytes == os.path.getsize(os.path.join(tmp_dir, "abc.json"))
@@ -0,0 +1,21 @@
+"""
+Тест отложенного импорта модулей в llm_integration
+"""
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+
+def test_llm_integration_defers_heavy_imports():
+    """Импорт llm_integration не загружает колоду, изображения, пользователей и обратную связь"""
+    deferred = ('src.card_manager', 'src.image_generator', 'src.user_manager', 'src.feedback_system', 'PIL')
+    code = (
+        "import sys\n"
+        "import src.llm_integration\n"
+        f"print(','.join(m for m in {deferred!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
@@ -0,0 +1,75 @@
+"""
+Тесты разбора единого ответа этапов 2-4 многоэтапной сессии
+"""
+import asyncio
+import os
+import sys
+
+# Добавляем путь к src для импорта модулей
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.llm_session import MultiStageLLMSession
+from src.prompt_manager import PromptManager
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+
+class FakeAgent:
+    """Агент, возвращающий заранее заданные ответы по очереди"""
+    model_name = "test/model"
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    async def send_request(self, context):
+        self.requests += 1
+        return self.responses.pop(0)
+
+
+def _make_session(responses):
+    prompt_manager = PromptManager(os.path.join(ROOT_DIR, "prompts"),
+                                   os.path.join(ROOT_DIR, "assets", "tarot-cards-images-info-ru.json"))
+    session = MultiStageLLMSession(FakeAgent(responses), prompt_manager)
+    session.llm_questions = ["Что вас беспокоит?"]
+    return session
+
+
+def test_single_request_with_markers():
+    """При наличии маркеров пользователь получает только финальную интерпретацию"""
+    session = _make_session([
+        "[CONTEXT_ANALYSIS]Анализ[/CONTEXT_ANALYSIS]\n[SYNTHESIS]Синтез[/SYNTHESIS]\n"
+        "[INTERPRETATION_START]\nИтог\n[INTERPRETATION_END]"
+    ])
+
+    assert asyncio.run(session.stage_2_4_single_request(["Работа"])) == "Итог"
+    assert session.agent.requests == 1
+
+
+def test_single_request_without_interpretation_markers():
+    """Без маркеров интерпретации берётся текст после последнего раздела"""
+    session = _make_session([
+        "[CONTEXT_ANALYSIS]Анализ[/CONTEXT_ANALYSIS]\n[SYNTHESIS]Синтез[/SYNTHESIS]\nИтог"
+    ])
+
+    assert asyncio.run(session.stage_2_4_single_request(["Работа"])) == "Итог"
+    assert session.agent.requests == 1
+
+
+def test_single_request_without_final_section_falls_back():
+    """Без финального раздела анализ и синтез не показываются, этапы выполняются последовательно"""
+    session = _make_session([
+        "[CONTEXT_ANALYSIS]Анализ[/CONTEXT_ANALYSIS]\n[SYNTHESIS]Синтез[/SYNTHESIS]",
+        "Анализ",
+        "Синтез",
+        "[INTERPRETATION_START]\nИтог\n[INTERPRETATION_END]",
+    ])
+    messages_before = len(session.context.messages)
+
+    result = asyncio.run(session.stage_2_4_single_request(["Работа"]))
+
+    assert result == "Итог"
+    assert session.agent.requests == 4
+    # В истории остаётся только последовательный проход: ответы, промпт 04, анализ, промпт 05, синтез, промпт 06
+    assert len(session.context.messages) == messages_before + 6
+    assert "[CONTEXT_ANALYSIS]" not in str(session.context.messages)
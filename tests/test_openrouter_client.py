@@ -0,0 +1,31 @@
+"""
+Тесты HTTP-сессий клиента OpenRouter
+"""
+import os
+import sys
+
+# Добавляем путь к src для импорта модулей
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src import openrouter_client
+
+
+def test_send_request_sync_uses_own_session(monkeypatch):
+    """Синхронный запрос не подменяет общую сессию и закрывает свою после ответа"""
+    used_sessions = []
+
+    async def fake_send_request(messages, model, api_key, max_retries, max_tokens, temperature, session=None):
+        assert session is not None and not session.closed
+        used_sessions.append(session)
+        return "Ответ"
+
+    monkeypatch.setattr(openrouter_client, "send_request", fake_send_request)
+    monkeypatch.setattr(openrouter_client, "_http_session", None)
+
+    for _ in range(2):
+        result = openrouter_client.send_request_sync([{"role": "user", "content": "Привет"}], "test/model", "key")
+        assert result == "Ответ"
+
+    assert len(used_sessions) == 2
+    assert all(session.closed for session in used_sessions)
+    assert openrouter_client._http_session is None